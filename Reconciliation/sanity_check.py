@@ -4,8 +4,12 @@ import numpy as np
 import pandas as pd
 import itertools
 import os
+import sys
 from tqdm import tqdm
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TextProcessing'))
+import subject_index
+
 import argparse
 from argparse import RawTextHelpFormatter
 def parse_option():
@@ -16,6 +20,8 @@ def parse_option():
        default='/shared/share_mamaysky-glasserman/energy_drivers/2020-11-16')
     parser.add_argument('--newPath', type=str, 
        default='/shared/share_mamaysky-glasserman/energy_drivers/2023')
+    parser.add_argument('--tagIndexPath', type=str, 
+       default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/subject_index/info')
     parser.add_argument('--check', type=str, default='topic')
     parser.add_argument('--getDifference', type=bool, default=False)
     parser.add_argument('--getAllMissingSubjects', type=bool, default=True)
@@ -85,20 +91,25 @@ Mismatching Proportion: {(old_sum-new_sum)/old_sum*100:.2f}%")
                 
                 if opt.getDifference:
                     raw = pd.read_csv(f'{opt.newPath}/DataProcessing/info/{YYYYMM}_info.csv')
+                    index = subject_index.load_month(opt.tagIndexPath, YYYYMM)
+                    if index is None or len(index) != len(raw):
+                        index = subject_index.SubjectIndex.from_subjects(raw['subject'])
+                    # row of every article in the month, to read its subjects from the index
+                    raw['row'] = np.arange(len(raw))
                     raw = raw.sort_values('TimeStamp').groupby('PNAC').first().reset_index()
 
                     old_selected = raw['headline'].isin(old['headline'])
                     if opt.getAllMissingSubjects:
                         new_selected = raw['headline'].isin(new['headline'])
-                        missing_tags_subjects = raw.loc[(old_selected) & (~new_selected), 'subject'].apply(eval).to_list()
+                        missing_tags_subjects = index.subjects(raw.loc[(old_selected) & (~new_selected), 'row'])
                         missing_tags_subjects = [[string[3:] for string in sublist if string.startswith('N2')] 
                                                  for sublist in missing_tags_subjects]
                         missing_tags_subjects_list.extend(missing_tags_subjects)
 
                     else:
-                        list_tags = raw.loc[old_selected, 'subject'].apply(eval).to_list()
+                        list_tags = index.subjects(raw.loc[old_selected, 'row'])
                         list_tags = flatten(list_tags)
-                        not_list_tags = raw.loc[~old_selected, 'subject'].apply(eval).to_list()
+                        not_list_tags = index.subjects(raw.loc[~old_selected, 'row'])
                         not_list_tags = flatten(not_list_tags)
 
                         diff_list_tags = list_tags.difference(not_list_tags)
@@ -0,0 +1,93 @@
+"""
+    Function           : Total-weighted aggregation of the article level measures.
+                         Every weighted numerator (entropy x total, Topic_i x total,
+                         Topic_i x sentiment x total, ...) is computed once as a column, the columns
+                         are summed with one groupby over the bucket, and the ratios are taken at
+                         the end. The bucket sums are additive, so daily sums can be re-bucketed
+                         into weeks, months or a custom calendar without the article level file.
+"""
+
+import pandas as pd
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def topic_count(df):
+    return sum(c.startswith('Topic') for c in df.columns)
+
+
+def prepare(df):
+    """Unclassified flag (topic weights summing to at most 0.98) and dropna, as in agg_daily.py."""
+    df = df.copy()
+    topic_cols = [c.startswith('Topic') for c in df.columns]
+    df['sum'] = df.loc[:, topic_cols].sum(axis=1)
+    df['Unclassified'] = (df['sum'] <= 0.98).astype(int)
+    return df.dropna()
+
+
+def numerators(df, n_topics):
+    """Per article: the weight (total) and every weighted numerator, plus a count column."""
+    total = df['total']
+    cols = {'article count': 1, 'total': total, 'entropy': df['entropy'] * total,
+            'Unclassified': df['Unclassified'] * total,
+            'Unclassified-Sentiment': df['Unclassified'] * df['sentiment'] * total}
+    for i in range(n_topics):
+        cols[f'Topic {i+1}'] = df[f'Topic{i+1}'] * total
+    for i in range(n_topics):
+        cols[f'Topic-Sentiment {i+1}'] = df[f'Topic{i+1}'] * df['sentiment'] * total
+    return pd.DataFrame(cols, index=df.index)
+
+
+def bucket_sums(df, buckets):
+    """Sum of every numerator column per bucket (one groupby)."""
+    return df.groupby(buckets).sum()
+
+
+def ratios(sums):
+    """Measures from bucket sums: article count and every numerator divided by the summed total."""
+    out = sums.drop(['total'], axis=1).div(sums['total'].astype(float), axis=0)
+    out['article count'] = sums['article count']
+    return out
+
+
+def to_datetime(dates):
+    """Dates as written by date_fixed_measures.py (YYYYMMDD, read back as integers) or ISO strings."""
+    dates = pd.Series(dates).astype(str)
+    try:
+        return pd.to_datetime(dates, format='%Y%m%d')
+    except ValueError:
+        return pd.to_datetime(dates)
+
+
+def buckets(dates, freq='daily', calendar=None):
+    """
+        dates    : the 'date' column (YYYYMMDD)
+        freq     : 'daily', or a pandas period alias such as 'W-FRI' (weeks ending Friday) or 'M',
+                   labelled by the last day of the period
+        calendar : optional frame with columns date and bucket mapping every date to its bucket
+                   (custom calendar); dates missing from it are dropped
+    """
+    if calendar is not None:
+        mapping = dict(zip(to_datetime(calendar['date']), calendar['bucket']))
+        return to_datetime(dates).map(mapping).rename('bucket')
+    if freq == 'daily':
+        return dates
+    # labelled by the last day of the period, e.g. the Friday of a W-FRI week
+    return to_datetime(dates).dt.to_period(freq).dt.end_time.dt.strftime('%Y%m%d').rename(freq)
+
+
+def aggregate(df, freq='daily', calendar=None):
+    """Article level measures -> (bucket measures, bucket sums)."""
+    df = prepare(df)
+    sums = bucket_sums(numerators(df, topic_count(df)), buckets(df['date'], freq, calendar))
+    return ratios(sums), sums
+
+
+def rebucket(daily_sums, freq, calendar=None):
+    """Bucket measures from daily sums (index: date)."""
+    dates = pd.Series(daily_sums.index, index=daily_sums.index)
+    sums = bucket_sums(daily_sums, buckets(dates, freq, calendar))
+    return ratios(sums), sums
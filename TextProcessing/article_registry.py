@@ -0,0 +1,63 @@
+"""
+    Function           : Global article index (Id -> row of the corpus) shared by dtm.py, dtm_numeric.py
+                         and concat.py. The registry is an append-only text file, one Id per line,
+                         and the index of an Id is its line number, so an article keeps its index
+                         when months are added or processed again. New Ids are appended under an
+                         exclusive file lock (several dtm.py processes may run at once) and every
+                         process reads only the lines appended since its last look.
+"""
+
+import os
+import fcntl
+import numpy as np
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+class ArticleRegistry(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _refresh(self, f):
+        """Read the Ids appended since the last call."""
+        f.seek(self.offset)
+        data = f.read()
+        for i in data.decode('utf-8').split('\n')[:-1]:
+            self.index.setdefault(i, len(self.index))
+        self.offset += len(data)
+
+    def lookup(self, Id):
+        """Global index of every Id, -1 where it is not registered."""
+        if os.path.isfile(self.path):
+            with open(self.path, 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                self._refresh(f)
+        return np.fromiter((self.index.get(i, -1) for i in map(str, Id)), dtype=np.int64, count=len(Id))
+
+    def register(self, Id):
+        """Global index of every Id, appending the new ones in order."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'ab+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._refresh(f)
+            new = []
+            for i in map(str, Id):
+                if i not in self.index:
+                    self.index[i] = len(self.index)
+                    new.append(i)
+            if new:
+                data = ''.join(f'{i}\n' for i in new).encode('utf-8')
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self.offset += len(data)
+        return np.fromiter((self.index[i] for i in map(str, Id)), dtype=np.int64, count=len(Id))
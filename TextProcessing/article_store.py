@@ -0,0 +1,168 @@
+"""
+    Function           : Columnar article store replacing the info / oil_info csv files.
+                         One partition per month, {storePath}/{YYYYMM}/, with two parquet files:
+                             meta.parquet : Id, TimeStamp (datetime64, UTC), PNAC, headline, subject (list),
+                                            TimeStamp_raw (the archive string, returned to the csv readers)
+                             body.parquet : augbod, in the same row order
+                         Readers ask for the columns they need; body.parquet is only opened when
+                         augbod is requested. meta.parquet is written last, so a partition whose
+                         meta.parquet exists is complete. Requires pyarrow (optional: without it the
+                         stages keep reading and writing the csv files).
+"""
+
+import os
+import ast
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+BODY_COLUMNS = ['augbod']
+
+
+def _schema(columns):
+    types = {'Id': pa.string(), 'TimeStamp': pa.timestamp('ns', tz='UTC'), 'TimeStamp_raw': pa.string(), 'PNAC': pa.string(),
+             'headline': pa.string(), 'subject': pa.list_(pa.string()), 'augbod': pa.string()}
+    return pa.schema([(c, types[c]) for c in columns])
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def partition(storePath, YYYYMM):
+    return f'{storePath}/{YYYYMM}'
+
+
+def has_month(storePath, YYYYMM):
+    return bool(storePath) and HAVE_PARQUET and os.path.isfile(f'{partition(storePath, YYYYMM)}/meta.parquet')
+
+
+def months(storePath):
+    """YYYYMM of every complete partition."""
+    if not HAVE_PARQUET or not os.path.isdir(storePath):
+        return []
+    return sorted(m for m in os.listdir(storePath) if has_month(storePath, m))
+
+
+def typed(df):
+    """Store types: TimeStamp as UTC datetime64 (its string kept as TimeStamp_raw), subject as a list (parsed if it is the csv string)."""
+    df = df.copy()
+    if 'TimeStamp' in df:
+        if 'TimeStamp_raw' not in df:
+            df['TimeStamp_raw'] = timestamp_strings(df)
+        df['TimeStamp'] = pd.to_datetime(df['TimeStamp'], utc=True, format='ISO8601')
+    if 'subject' in df:
+        df['subject'] = pd.Series([ast.literal_eval(s) if isinstance(s, str) else s for s in df['subject']],
+                                  index=df.index, dtype=object)
+    return df
+
+
+def timestamp_strings(df):
+    """
+        TimeStamp of the articles as in the raw archive and the csv files: TimeStamp_raw when the frame
+        has it, TimeStamp if it is still the string, else (partitions written before TimeStamp_raw)
+        formatted with milliseconds, e.g. 2020-01-02T03:04:05.678Z
+    """
+    if 'TimeStamp_raw' in df:
+        return df['TimeStamp_raw']
+    if not pd.api.types.is_datetime64_any_dtype(df['TimeStamp']):
+        return df['TimeStamp']
+    return df['TimeStamp'].dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3] + 'Z'
+
+
+class MonthWriter(object):
+    """
+        Writes one partition chunk by chunk (one parquet row group per chunk), so memory is bounded
+        by the chunk size. Files are written under temporary names and renamed by close().
+    """
+
+    def __init__(self, storePath, YYYYMM, columns):
+        if not HAVE_PARQUET:
+            raise ImportError('article_store needs pyarrow (pip install pyarrow)')
+        self.path = partition(storePath, YYYYMM)
+        os.makedirs(self.path, exist_ok=True)
+        meta = [c for c in columns if c not in BODY_COLUMNS]
+        if 'TimeStamp' in meta and 'TimeStamp_raw' not in meta:
+            meta.append('TimeStamp_raw')
+        body = [c for c in columns if c in BODY_COLUMNS]
+        self.writers = {name: pq.ParquetWriter(f'{self.path}/{name}.parquet.tmp', _schema(cols))
+                        for name, cols in [('meta', meta), ('body', body)]}
+
+    def write(self, df):
+        df = typed(df)
+        for writer in self.writers.values():
+            table = pa.Table.from_pandas(df[writer.schema.names], schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+
+    def close(self):
+        for name in ['body', 'meta']:
+            self.writers[name].close()
+            os.replace(f'{self.path}/{name}.parquet.tmp', f'{self.path}/{name}.parquet')
+
+
+def write_month(storePath, YYYYMM, df):
+    writer = MonthWriter(storePath, YYYYMM, list(df.columns))
+    writer.write(df)
+    writer.close()
+
+
+def read_month(storePath, YYYYMM, columns=None):
+    """
+        columns : columns to read (default all); body.parquet is read only for augbod
+        Return  : data frame with TimeStamp as datetime64 (and its string TimeStamp_raw) and subject as lists
+    """
+    path = partition(storePath, YYYYMM)
+    meta_columns = pq.read_schema(f'{path}/meta.parquet').names
+    if columns is None:
+        columns = meta_columns + BODY_COLUMNS
+    elif 'TimeStamp' in columns and 'TimeStamp_raw' in meta_columns and 'TimeStamp_raw' not in columns:
+        columns = list(columns) + ['TimeStamp_raw']
+    frames = []
+    meta = [c for c in columns if c in meta_columns]
+    body = [c for c in columns if c in BODY_COLUMNS]
+    if meta or not body:
+        frames.append(pq.read_table(f'{path}/meta.parquet', columns=meta).to_pandas())
+    if body:
+        frames.append(pq.read_table(f'{path}/body.parquet', columns=body).to_pandas())
+    df = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+    if 'subject' in df:
+        df['subject'] = [list(s) if s is not None else s for s in df['subject']]
+    return df[columns]
+
+
+def month_files(storePath, csvPath, prefix=''):
+    """YYYYMM -> {csvPath}/{prefix}{YYYYMM}_info.csv of every month in the store or in the csv folder."""
+    csv_months = [f[-15:-9] for f in os.listdir(csvPath) if f.startswith(prefix) and f.endswith('_info.csv')] \
+        if os.path.isdir(csvPath) else []
+    return {YYYYMM: f'{csvPath}/{prefix}{YYYYMM}_info.csv' for YYYYMM in sorted(set(csv_months) | set(months(storePath)))}
+
+
+def read_info(storePath, file, YYYYMM, columns, encoding='utf-8'):
+    """
+        Columns of one month in the layout of the csv files (TimeStamp as the archive string), from
+        the store if it has the month, else from the csv file. `encoding` is the one the stage reads
+        the csv with; store text is re-decoded the same way so both sources give the same strings.
+    """
+    if not has_month(storePath, YYYYMM):
+        return pd.read_csv(file, delimiter=',', usecols=columns, encoding=encoding)[columns]
+    df = read_month(storePath, YYYYMM, columns)
+    if 'TimeStamp' in df:
+        df['TimeStamp'] = timestamp_strings(df)
+    df = df[columns]
+    return decoded(df, encoding)
+
+
+def decoded(df, encoding='utf-8'):
+    """Text columns of a frame as a stage reading its utf-8 csv file with `encoding` sees them."""
+    if encoding.lower().replace('-', '') != 'utf8':
+        df = df.copy()
+        for c in ['Id', 'PNAC', 'headline', 'augbod']:
+            if c in df:
+                df[c] = [v.encode('utf-8').decode(encoding) if isinstance(v, str) else v for v in df[c]]
+    return df
@@ -1,29 +1,85 @@
 #!/user/kh3191/.conda/envs/nlp/bin/python
 
 import pandas as pd
+import numpy as np
 from scipy import sparse
 
+import os
 import glob
+import shutil
 from tqdm import tqdm
 
+import sparse_dtm
+import gram_matrix
+from sparse_corpus import SparseCorpus
+from article_registry import ArticleRegistry
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--inputPath_info', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/combined_info')
+    parser.add_argument('--inputPath_dtm', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_Clustering_C')
+    parser.add_argument('--outputPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat')
+    parser.add_argument('--registryPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_registry.txt')
+    opt = parser.parse_args()
+    return opt
+
+opt = parse_option()
+print(opt)
+
 # concat all info
-folder_path = '/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/combined_info'
+folder_path = opt.inputPath_info
 csv_files = glob.glob(folder_path + '/*_info.csv')
 csv_files.sort()
 
 concatenated_df = pd.concat([pd.read_csv(file) for file in tqdm(csv_files)], ignore_index=True)
 
-output_file = '/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat/info_concatenate.csv'
+output_file = f'{opt.outputPath}/info_concatenate.csv'
 concatenated_df.to_csv(output_file, index=False)
 
-# concat dtm
-folder_path = '/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_Clustering_C'
-csv_files = glob.glob(folder_path + '/*_dtm.csv')
-csv_files.sort()
+# concat dtm: the monthly dtm files are appended to the sparse corpus (sparse_corpus.py) when they are new
+# or changed, and dtm_concatenate.npz is written from it without densifying any month
+files = gram_matrix.month_files(opt.inputPath_dtm)
 
-concatenated_df = pd.concat([pd.read_csv(file) for file in tqdm(csv_files)], ignore_index=True)
-output_file = '/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat/dtm_concatenate.npz'
-print('Converting to sparse matrix')
-sparse_matrix = sparse.csr_matrix(concatenated_df.iloc[:,2:])
-print('Writing concatenated df')
-sparse.save_npz(output_file, sparse_matrix)
+
+def read_month(file):
+    if file.endswith('.npz'):
+        matrix, Id, _, _ = sparse_dtm.load_month(file)
+    else:
+        matrix, Id, _, _ = sparse_dtm.read_csv_month(file)
+    return matrix, Id
+
+
+def month_words(file):
+    if file.endswith('.npz'):
+        return sparse_dtm.load_month(file)[3].tolist()
+    return pd.read_csv(file, nrows=0).columns[2:].tolist()
+
+
+corpus_path = f'{opt.outputPath}/dtm_corpus'
+words = month_words(next(iter(files.values()))) if files else []
+if os.path.isfile(f'{corpus_path}/words.txt') and SparseCorpus(corpus_path).words != words:
+    print('Word list changed, writing the sparse corpus again')
+    shutil.rmtree(corpus_path)
+corpus = SparseCorpus(corpus_path, words)
+registry = ArticleRegistry(opt.registryPath)
+for YYYYMM, file in tqdm(files.items()):
+    stamp = gram_matrix.stamp(file)
+    if corpus.stamp(YYYYMM) != stamp:
+        matrix, Id = read_month(file)
+        corpus.append(YYYYMM, matrix, registry.register(Id), stamp)
+for YYYYMM in corpus.months.index.difference(list(files)):
+    corpus.remove(YYYYMM)
+if corpus.garbage() > corpus.rows // 2:
+    print('Compacting the sparse corpus')
+    corpus.compact()
+
+output_file = f'{opt.outputPath}/dtm_concatenate.npz'
+print('Writing concatenated dtm')
+sparse_matrix, _ = corpus.span()
+sparse.save_npz(output_file, sparse_matrix.astype(np.int64))
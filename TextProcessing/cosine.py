@@ -1,17 +1,27 @@
 #!/user/kh3191/.conda/envs/nlp/bin/python
  
 """
-    Function           : This code generate the cosine file. This takes some time to run if dtm is big	
+    Function           : This code generate the cosine file.
+                         The word co-occurrence Gram matrix is accumulated month by month from the
+                         sparse monthly dtm files (gram_matrix.py) and kept in --gramPath, so a rerun
+                         only reads the months added to (or dropped from) the time span.
+                         With --topK > 0 (a full vocabulary word list) the dense matrix is not formed:
+                         only the top-k neighbours of every word are computed, a block of words at a
+                         time (cosine_neighbours.py), and saved as a sparse graph cosine_top{k}.npz
+                         for louvain.py --neighboursPath.
 """
 
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy import sparse
 import numpy as np
-
 import os
+from scipy import sparse
 from tqdm import tqdm
 
+import cosine_neighbours
+import gram_matrix
+from gram_matrix import GramMatrix
+from sparse_corpus import SparseCorpus
+
 
 import argparse
 from argparse import RawTextHelpFormatter
@@ -21,9 +31,24 @@ def parse_option():
            #default='clustering_C.csv')
            default='2018-05-04 energy word grouping 387 words.xlsx')
     parser.add_argument('--dtmPath', type=str, 
-           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_numeric')
-    parser.add_argument('--outputDtmPath', type=str, 
-           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat')
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_numeric',
+           help='monthly triplets of dtm.py / dtm_numeric.py (YYYYMM_coo.npz) or dtm files of dtm.py')
+    parser.add_argument('--corpusPath', type=str, default='',
+           help='read the months from the sparse corpus of concat.py (.../concat/dtm_corpus) instead of --dtmPath')
+    parser.add_argument('--gramPath', type=str, 
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/cosine/gram.npz')
+    parser.add_argument('--startMonth', type=str, default='', help='YYYYMM, first month of the time span (default all)')
+    parser.add_argument('--endMonth', type=str, default='', help='YYYYMM, last month of the time span')
+    parser.add_argument('--overwrite', type=bool, default=False, help='accumulate the Gram matrix again from every month')
+    parser.add_argument('--topK', type=int, default=0,
+           help='keep only the top-k neighbours of every word (sparse graph, for large vocabularies); 0 writes cosine.csv')
+    parser.add_argument('--minSimilarity', type=float, default=0.0, help='--topK: drop the neighbours below this similarity')
+    parser.add_argument('--blockSize', type=int, default=1024, help='--topK: words per block (memory blockSize x words)')
+    parser.add_argument('--projectionDim', type=int, default=0,
+           help='--topK: preselect the candidates on random projections of this dimension (0: exact);\n'
+                'the error of the projected cosine is about 1/sqrt(dim), so weak similarities need a large dim')
+    parser.add_argument('--oversample', type=int, default=4, help='--projectionDim: candidates per word = topK * oversample')
+    parser.add_argument('--seed', type=int, default=0)
     parser.add_argument('--outputCosinePath', type=str, 
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/cosine')
     opt = parser.parse_args()
@@ -40,51 +65,50 @@ elif opt.inputWordsPath.endswith('xlsx'):
     word_set = words_test.Word.tolist()
 print(f'Number of words to create cosine-similarity matrix: {len(word_set)}')
 
-pathin = [f"{opt.dtmPath}/{f}" for f in os.listdir(opt.dtmPath)]
-frames = [pd.read_csv(j, delimiter=',') for j in tqdm(pathin)]
-df = pd.concat(frames)
-#df.to_csv(f'{opt.outputDtmPath}/dtm_numeric_concatenate.csv')
-print(f"Length of df: {len(df)}")
-
-df = df.query('words>=0')
-print(f"Length of filtered df: {len(df)}")
-
-word_column = df.words.tolist()
-id_column = df.Id.tolist()
-freq_column = df.freq.tolist()
-
-del df #release memory
-
-print(len(word_column))
-print(len(id_column))
-print(len(freq_column))
-print(len(list(set(word_column))))
-print(len(list(set(id_column))))
-
-
-V = np.array(freq_column)
-I = np.array(id_column)
-J = np.array(word_column)
-
-del freq_column #release memory
-del id_column #release memory
-del word_column #release memory
-
-
-print(V.shape)
-print(I.shape)
-print(J.shape)
-
-A = sparse.csr_matrix((V,(J,I)))
-print(A.shape)
-del V
-del I
-del J
-
-similarities = cosine_similarity(A)
-print(similarities.shape)
-del A
-
-
-df_cosine = pd.DataFrame(data=similarities, index=word_set, columns=word_set)
-df_cosine.to_csv(f"{opt.outputCosinePath}/cosine.csv")
+if opt.corpusPath:
+    corpus = SparseCorpus(opt.corpusPath)
+    stamps = {m: corpus.stamp(m) for m in corpus.months.index}
+    def read_month(YYYYMM):
+        return gram_matrix.reorder(corpus.month(YYYYMM)[0], corpus.words, word_set)
+else:
+    files = gram_matrix.month_files(opt.dtmPath)
+    stamps = {m: gram_matrix.stamp(f) for m, f in files.items()}
+    def read_month(YYYYMM):
+        return gram_matrix.read_month(files[YYYYMM], word_set)
+span = [m for m in sorted(stamps) if (not opt.startMonth or m >= opt.startMonth) and (not opt.endMonth or m <= opt.endMonth)]
+
+if opt.topK > 0:
+    # the words x words matrix is never formed: the dtm of the span is stacked (sparse) and the
+    # similarities are computed a block of words at a time
+    matrix = sparse.vstack([read_month(m) for m in tqdm(span)] or [sparse.csr_matrix((0, len(word_set)))], format='csr')
+    totals = np.asarray(matrix.sum(axis=0)).ravel()
+    graph = cosine_neighbours.neighbours(matrix, opt.topK, opt.minSimilarity, opt.blockSize,
+                                         opt.projectionDim, opt.oversample, opt.seed)
+    print(f'{graph.nnz} neighbours of {len(word_set)} words')
+    cosine_neighbours.save(f'{opt.outputCosinePath}/cosine_top{opt.topK}.npz', word_set, totals, graph)
+
+else:
+    gram = None
+    if os.path.isfile(opt.gramPath) and not opt.overwrite:
+        gram = GramMatrix.load(opt.gramPath)
+        if gram.words != word_set or gram.stale(stamps):
+            print('Word list or dtm files changed, accumulating the Gram matrix again')
+            gram = None
+    if gram is None:
+        gram = GramMatrix(word_set)
+
+    drop = sorted(set(gram.months).difference(span))
+    add = [m for m in span if m not in gram.months]
+    print(f'Gram matrix: {len(gram.months)} months, dropping {len(drop)}, adding {len(add)}')
+    for YYYYMM in tqdm(drop):
+        gram.remove(read_month(YYYYMM), YYYYMM)
+    for YYYYMM in tqdm(add):
+        gram.add(read_month(YYYYMM), YYYYMM, stamps[YYYYMM])
+    if drop or add:
+        gram.save(opt.gramPath)
+
+    similarities = gram.cosine()
+    print(similarities.shape)
+
+    df_cosine = pd.DataFrame(data=similarities, index=word_set, columns=word_set)
+    df_cosine.to_csv(f"{opt.outputCosinePath}/cosine.csv")
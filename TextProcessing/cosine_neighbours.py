@@ -0,0 +1,109 @@
+"""
+    Function           : Top-k cosine neighbours of every word, for vocabularies too large for the dense
+                         words x words matrix of cosine.py (cosine.py --topK).
+                         With W the words x articles counts scaled to unit rows, the cosine similarities
+                         of a block of words are the rows W[block] W^T: they are computed --blockSize
+                         words at a time, so besides the dtm only a blockSize x words block is in memory,
+                         and only the k largest similarities of every row (above a threshold) are kept.
+                         With --projectionDim > 0 the candidates are preselected on random projections
+                         (P = W R with R Gaussian articles x dim, P rows scaled to unit length, so P P^T
+                         approximates the cosine): the k * oversample best of every row are then computed
+                         exactly and the k best of these kept.
+                         The neighbour graph (row word -> its neighbours, not symmetric) is saved with
+                         the words and their totals, and read by louvain.py --neighboursPath.
+"""
+
+import os
+import numpy as np
+from scipy import sparse
+from tqdm import tqdm
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def unit_rows(matrix):
+    """words x articles float32 matrix (from the articles x words counts) with rows of unit length."""
+    matrix = sparse.csr_matrix(matrix.T, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.csr_matrix(sparse.diags(inv.astype(np.float32)) @ matrix)
+
+
+def projection(matrix, dim, seed=0, chunk=100000):
+    """Random projection (words x dim, unit rows) of the articles x words counts, summed over article chunks."""
+    rng = np.random.default_rng(seed)
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    projected = np.zeros((matrix.shape[1], dim), dtype=np.float32)
+    for start in range(0, matrix.shape[0], chunk):
+        rows = matrix[start:start + chunk]
+        projected += rows.T @ rng.standard_normal((rows.shape[0], dim), dtype=np.float32)
+    # scaling the words to unit length does not change the direction; words that never occur stay 0
+    lengths = np.linalg.norm(projected, axis=1)
+    projected /= np.where(lengths > 0, lengths, 1)[:, None]
+    return projected
+
+
+def top_k(similarity, k, min_similarity=0.0):
+    """(rows, columns, values) of the k largest positive similarities >= min_similarity of every row."""
+    k = min(k, similarity.shape[1])
+    columns = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(similarity, columns, axis=1)
+    rows = np.repeat(np.arange(similarity.shape[0]), k)
+    columns, values = columns.ravel(), values.ravel()
+    keep = (values > 0) & (values >= min_similarity)
+    return rows[keep], columns[keep], values[keep]
+
+
+def neighbours(matrix, k, min_similarity=0.0, block_size=1024, projection_dim=0, oversample=4, seed=0):
+    """
+        matrix : articles x words counts
+        Return : words x words CSR matrix with the top-k cosine similarities of every row (no diagonal)
+    """
+    n_words = matrix.shape[1]
+    words = unit_rows(matrix)
+    words_t = sparse.csr_matrix(words.T)
+    projected = projection(matrix, projection_dim, seed) if projection_dim > 0 else None
+    rows, columns, values = [], [], []
+    for start in tqdm(range(0, n_words, block_size)):
+        block = np.arange(start, min(start + block_size, n_words))
+        if projected is None:
+            similarity = (words[block] @ words_t).toarray()
+            similarity[np.arange(len(block)), block] = -np.inf
+            r, c, v = top_k(similarity, k, min_similarity)
+        else:
+            approximate = projected[block] @ projected.T
+            approximate[np.arange(len(block)), block] = -np.inf
+            m = min(k * oversample, n_words)
+            candidates = np.argpartition(-approximate, m - 1, axis=1)[:, :m]
+            union, position = np.unique(candidates, return_inverse=True)
+            exact = (words[block] @ words[union].T).toarray()
+            similarity = np.take_along_axis(exact, position.reshape(candidates.shape), axis=1)
+            similarity[candidates == block[:, None]] = -np.inf
+            r, c, v = top_k(similarity, k, min_similarity)
+            c = candidates[r, c]
+        rows.append(block[r])
+        columns.append(c)
+        values.append(v)
+    if not rows:
+        return sparse.csr_matrix((n_words, n_words), dtype=np.float32)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape=(n_words, n_words), dtype=np.float32)
+
+
+def save(path, words, totals, graph):
+    graph = sparse.csr_matrix(graph)
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_path, words=np.asarray(words, dtype=str), totals=np.asarray(totals, dtype=np.int64),
+             indptr=graph.indptr, indices=graph.indices, data=graph.data)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """words, word totals, neighbour graph (CSR)"""
+    with np.load(path) as f:
+        words = f['words'].tolist()
+        graph = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=(len(words), len(words)))
+        return words, f['totals'], graph
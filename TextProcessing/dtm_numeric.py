@@ -1,27 +1,38 @@
 #!/user/kh3191/.conda/envs/nlp/bin/python
- 
+
 """
     Function           : This code converts the words and article ids in dtm files to numbers.
                         The reason is: this is the format that the sparse matrix in cosine code gets
+                        dtm.py now writes these (global article, word, count) triplets itself
+                        (YYYYMM_coo.npz, see --cooPath); this script converts the dtm files of
+                        months written before, reading the sparse YYYYMM_dtm.npz (or the dense csv)
+                        and numbering the articles with the global article registry.
 """
 
 import pandas as pd
 import os
 from tqdm import tqdm
 
+import sparse_dtm
+import gram_matrix
+from article_registry import ArticleRegistry
+
 import argparse
 from argparse import RawTextHelpFormatter
 def parse_option():
     parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
-    parser.add_argument('--inputWordsPath', type=str, 
+    parser.add_argument('--inputWordsPath', type=str,
            #default='clustering_C.csv')
            default='2018-05-04 energy word grouping 387 words.xlsx')
-    parser.add_argument('--dtmPath', type=str, 
+    parser.add_argument('--dtmPath', type=str,
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_Clustering_C')
-    parser.add_argument('--concatInfoPath', type=str, 
-           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat/info_concatenate.csv')
-    parser.add_argument('--outputPath', type=str, 
+    parser.add_argument('--registryPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_registry.txt')
+    parser.add_argument('--concatInfoPath', type=str, default='',
+           help='info_concatenate.csv: number a new registry in its order (the article ids of the old dtm_numeric files)')
+    parser.add_argument('--outputPath', type=str,
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_numeric')
+    parser.add_argument('--overwrite', type=bool, default=False)
     opt = parser.parse_args()
     return opt
 
@@ -30,42 +41,25 @@ print(opt)
 
 
 if opt.inputWordsPath.endswith('csv'):
-    words_test = pd.read_csv(opt.inputWordsPath, sep=',', names=['word','Topic','freq'])
-    word_set = words_test['word'][1:].tolist()
+    word_set = pd.read_csv(opt.inputWordsPath, sep=',').word.tolist()
 elif opt.inputWordsPath.endswith('xlsx'):
     words_test = pd.read_excel(opt.inputWordsPath)
     word_set = words_test['Word'].tolist()
-    
-dic_word = {k: v for v, k in enumerate(word_set)}
-def func_word(item):
-    return dic_word.get(item, -1)
-
-df_selected = pd.read_csv(opt.concatInfoPath, sep=',')
-id_set = df_selected.Id.tolist()
-dic_id = {k: v for v, k in enumerate(id_set)}
-def func_id(item):
-    return dic_id.get(item, -1)
 
 
 if __name__ == "__main__":
-    
-    for file in tqdm(os.listdir(opt.dtmPath)):
-
-        df = pd.read_csv(f"{opt.dtmPath}/{file}")
-        df = pd.melt(df, id_vars=list(df)[:2], value_vars=list(df)[2:], var_name='words', value_name='freq')
-        df = df[df['freq']!=0]
-
-        word_column = df.words.tolist()
-        id_column = df.Id.tolist()
-        freq_column = df.freq.tolist()
-
-        V = freq_column
-        I = list(map(func_id,id_column))
-        J = list(map(func_word,word_column))
 
-        df_out = pd.DataFrame()
-        df_out['freq'] = V
-        df_out['Id'] = I
-        df_out['words'] = J
+    registry = ArticleRegistry(opt.registryPath)
+    if opt.concatInfoPath and not os.path.isfile(opt.registryPath):
+        registry.register(pd.read_csv(opt.concatInfoPath, sep=',', usecols=['Id']).Id.tolist())
 
-        df_out.to_csv(f"{opt.outputPath}/{file}",index=False)
+    for YYYYMM, file in tqdm(gram_matrix.month_files(opt.dtmPath).items()):
+        output = f'{opt.outputPath}/{YYYYMM}_coo.npz'
+        if os.path.isfile(output) and not opt.overwrite:
+            continue
+        if file.endswith('.npz'):
+            _, Id, _, _ = sparse_dtm.load_month(file)
+        else:
+            Id = pd.read_csv(file, usecols=['Id']).Id.to_numpy()
+        dtm = gram_matrix.read_month(file, word_set)
+        sparse_dtm.save_coo(output, dtm, registry.register(Id), word_set)
@@ -0,0 +1,76 @@
+"""
+    Function           : Vectorized per-article entropy.
+                         For an article with 4-gram occurrences g_1..g_n,
+                             entropy = -1/n * sum_i log((c4(g_i) + 1) / (c3(prefix(g_i)) + 10))
+                         with c4, c3 the rolling-window 4gram and 3gram counts. This equals the
+                         original sum over distinct 4-grams of -p * log(M).
+"""
+
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+import ngram_count
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def grams_from_lists(gram_lists, hashed=False):
+    """
+        gram_lists : per article, the list of its '.'-joined 4-grams
+        hashed     : key the grams by their 64-bit hash (binary ngram.py counts) instead of strings
+        Return     : (doc_index, codes, keys4, keys3) with one entry of doc_index/codes per
+                     occurrence, keys4[codes] its 4-gram and keys3[codes] the 3-gram prefix
+    """
+    lengths = np.fromiter((len(g) for g in gram_lists), dtype=np.int64, count=len(gram_lists))
+    doc_index = np.repeat(np.arange(len(gram_lists)), lengths)
+    codes, keys = pd.factorize(pd.Series(list(chain.from_iterable(gram_lists)), dtype=object))
+    keys = list(keys)
+    if hashed:
+        return doc_index, codes, ngram_count.key_hashes(keys).tolist(), ngram_count.key_hashes(prefixes(keys)).tolist()
+    return doc_index, codes, keys, prefixes(keys)
+
+
+def grams_from_month(month, stream, hashed=False):
+    """
+        Same as grams_from_lists, but from the integer-coded token stream of a cached month
+        (token_cache.MonthTokens); only the distinct 4-grams are looked up.
+    """
+    batch, grams = ngram_count.extract(month, stream, (4,))
+    doc_index, codes = ngram_count.order_batch(batch, 4)
+    if hashed:
+        th = ngram_count.token_hashes(month.vocab)[grams[4]]
+        return doc_index, codes, ngram_count.fold(th, 4).tolist(), ngram_count.fold(th, 3).tolist()
+
+    keys = ['.'.join(row) for row in month.vocab[grams[4]].tolist()]
+    return doc_index, codes, keys, prefixes(keys)
+
+
+def prefixes(keys):
+    """3-gram prefix of each 4-gram key."""
+    return ['.'.join(l.split('.')[:3]) for l in keys]
+
+
+def entropy(doc_index, gram_ids, prefix_ids, counts4, counts3, n_docs):
+    """
+        doc_index  : article of every 4-gram occurrence
+        gram_ids   : 4-gram id of every occurrence in counts4, -1 if unseen
+        prefix_ids : 3-gram prefix id of every occurrence in counts3, -1 if unseen
+        Return     : entropy of every article, 0 for articles without 4-grams
+    """
+    c4 = np.where(gram_ids >= 0, counts4[np.maximum(gram_ids, 0)], 0)
+    c3 = np.where(prefix_ids >= 0, counts3[np.maximum(prefix_ids, 0)], 0)
+    log_m = np.log((c4 + 1) / (c3 + 10))
+    sums = np.bincount(doc_index, weights=-log_m, minlength=n_docs)
+    lengths = np.bincount(doc_index, minlength=n_docs)
+    return np.divide(sums, lengths, out=np.zeros(n_docs), where=lengths > 0)
+
+
+def month_entropy(doc_index, codes, keys4, keys3, stop3_dict, stop4_dict, n_docs):
+    """Entropy of every article against the rolling window counts (ngram_store.RollingNgramCounts)."""
+    ids4 = stop4_dict.ids(keys4)[codes]
+    ids3 = stop3_dict.ids(keys3)[codes]
+    return entropy(doc_index, ids4, ids3, stop4_dict.counts, stop3_dict.counts, n_docs)
@@ -0,0 +1,137 @@
+"""
+    Function           : Word co-occurrence Gram matrix for cosine.py, accumulated month by month.
+                         With A the words x articles count matrix,
+                             cosine(w1, w2) = G[w1, w2] / sqrt(G[w1, w1] * G[w2, w2]),   G = A A^T
+                         Every article is in one monthly dtm, so G is the sum of the monthly
+                         A_m A_m^T: each month is read as a sparse block, added to G and dropped,
+                         and memory is O(words^2) whatever the number of articles. The column norms
+                         are the square roots of the diagonal of G; the word totals (freq column of
+                         the topic files written by louvain.py) are summed along.
+                         G is saved with its months and the stamp (size, mtime) of their dtm files
+                         (.npz), so a new month is added to an existing matrix and a month leaving the
+                         time span is subtracted from it.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import sparse_dtm
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def month_files(dtmPath):
+    """
+        YYYYMM -> monthly dtm file: triplets YYYYMM_coo.npz (dtm.py --cooPath, dtm_numeric.py), else the
+        sparse YYYYMM_dtm.npz, else a YYYYMM_dtm.csv (dense of dtm.py or long of the old dtm_numeric.py)
+    """
+    preference = {'_coo.npz': 0, '_dtm.npz': 1, '_dtm.csv': 2}
+    files = {}
+    for f in sorted(os.listdir(dtmPath)):
+        if f[:6].isdigit() and f[6:] in preference:
+            if f[:6] not in files or preference[f[6:]] < preference[files[f[:6]][-8:]]:
+                files[f[:6]] = f'{dtmPath}/{f}'
+    return files
+
+
+def stamp(path):
+    st = os.stat(path)
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+def read_month(path, words):
+    """Articles x words CSR matrix of a monthly dtm file, columns in the order of `words`."""
+    if path.endswith('_coo.npz'):
+        article, word, count, articles, file_words = sparse_dtm.load_coo(path)
+        order = np.argsort(articles)
+        rows = order[np.searchsorted(articles[order], article)]
+        matrix = sparse.csr_matrix((count, (rows, word)), shape=(len(articles), len(file_words)))
+    elif path.endswith('.npz'):
+        matrix, _, _, file_words = sparse_dtm.load_month(path)
+    else:
+        header = pd.read_csv(path, nrows=0).columns.tolist()
+        if header == ['freq', 'Id', 'words']:
+            # dtm_numeric.py: one row per (article, word) with the word's position in the word list
+            df = pd.read_csv(path).query('words>=0')
+            rows, _ = pd.factorize(df['Id'])
+            return sparse.csr_matrix((df['freq'].to_numpy(), (rows, df['words'].to_numpy())),
+                                     shape=(rows.max() + 1 if len(rows) else 0, len(words)))
+        matrix, _, _, file_words = sparse_dtm.read_csv_month(path)
+    return reorder(matrix, file_words, words)
+
+
+def reorder(matrix, file_words, words):
+    """Columns of the matrix (in the order of file_words) in the order of `words`; other words dropped."""
+    file_words = list(file_words)
+    if file_words == list(words):
+        return matrix
+    index = sparse_dtm.vocab_index(words)
+    columns = np.array([index.get(w, -1) for w in file_words], dtype=np.int64)
+    matrix = matrix.tocoo()
+    keep = columns[matrix.col] >= 0
+    return sparse.csr_matrix((matrix.data[keep], (matrix.row[keep], columns[matrix.col[keep]])),
+                             shape=(matrix.shape[0], len(words)))
+
+
+class GramMatrix(object):
+
+    def __init__(self, words, gram=None, months=None, totals=None):
+        """months : YYYYMM -> stamp of the dtm file it was read from"""
+        self.words = list(words)
+        self.gram = gram if gram is not None else np.zeros((len(self.words), len(self.words)), dtype=np.int64)
+        self.totals = totals if totals is not None else np.zeros(len(self.words), dtype=np.int64)
+        self.months = dict(months or {})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            if 'totals' not in f:
+                # written before the totals were kept: no months, so it is summed again
+                return cls(f['words'].tolist())
+            return cls(f['words'].tolist(), f['gram'], zip(f['months'].tolist(), f['stamps'].tolist()), f['totals'])
+
+    def save(self, path):
+        months = sorted(self.months)
+        tmp_path = path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_path, words=np.asarray(self.words, dtype=str), gram=self.gram, totals=self.totals,
+                 months=np.asarray(months, dtype=str), stamps=np.asarray([self.months[m] for m in months], dtype=str))
+        os.replace(tmp_path, path)
+
+    def stale(self, stamps):
+        """Months whose dtm is gone or changed since it was added (they cannot be subtracted); stamps: YYYYMM -> stamp"""
+        return [m for m, s in self.months.items() if stamps.get(m) != s]
+
+    @staticmethod
+    def block(matrix):
+        """A_m A_m^T of an articles x words matrix."""
+        matrix = matrix.tocsr().astype(np.int64)
+        return (matrix.T @ matrix).toarray()
+
+    def add(self, matrix, YYYYMM, source=''):
+        if YYYYMM in self.months:
+            raise ValueError(f'{YYYYMM} is already in the Gram matrix')
+        self.gram += self.block(matrix)
+        self.totals += np.asarray(matrix.sum(axis=0), dtype=np.int64).ravel()
+        self.months[YYYYMM] = source
+
+    def remove(self, matrix, YYYYMM):
+        """Subtract a month added before (with the same dtm)."""
+        if YYYYMM not in self.months:
+            raise ValueError(f'{YYYYMM} is not in the Gram matrix')
+        self.gram -= self.block(matrix)
+        self.totals -= np.asarray(matrix.sum(axis=0), dtype=np.int64).ravel()
+        del self.months[YYYYMM]
+
+    def norms(self):
+        return np.sqrt(np.diag(self.gram).astype(np.float64))
+
+    def cosine(self):
+        """Cosine similarity of the words (0 for words that never occur, as sklearn's cosine_similarity)."""
+        norms = self.norms()
+        inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return self.gram * inv[:, None] * inv[None, :]
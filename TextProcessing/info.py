@@ -6,20 +6,25 @@
 
 import os
 import pandas as pd
-from dateutil import tz
-from datetime import datetime
 from tqdm import tqdm
 
+import article_store
+import session_calendar
+
 import argparse
 from argparse import RawTextHelpFormatter
 def parse_option():
     parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
     parser.add_argument('--inputPath', type=str, 
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/oil_info')
+    parser.add_argument('--storePath', type=str, 
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/oil_info')
     parser.add_argument('--measurePath', type=str, 
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_measure')
     parser.add_argument('--outputPath', type=str, 
            default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/combined_info')
+    parser.add_argument('--months', type=str, default='',
+           help='comma separated YYYYMM to process (default all), set by pipeline.py')
     opt = parser.parse_args()
     return opt
 
@@ -27,35 +32,14 @@ opt = parse_option()
 print(opt)
 
 
-#################
-####FUNCTIONS####
-#################
-def UTC_to_NY(row):
-    x = row['TimeStamp']
-    # Hardcode zones:
-    from_zone = tz.gettz('UTC')
-    to_zone = tz.gettz('America/New_York')
-    
-    utc = datetime.strptime(x[0:19], '%Y-%m-%dT%H:%M:%S')
-    
-    # Tell the datetime object that it's in UTC time zone since 
-    # datetime objects are 'naive' by default
-    utc = utc.replace(tzinfo=from_zone)
-    
-    # Convert time zone
-    est = utc.astimezone(to_zone)
-    est_timestamp = est.strftime('%Y-%m-%dT%H:%M:%S')+x[19:]
-    return est_timestamp
-################
-
-
 if __name__ == "__main__":
 
-    for file in tqdm(os.listdir(opt.inputPath)):
-        YYYYMM = file[-15:-9]
+    for YYYYMM, file in tqdm(article_store.month_files(opt.storePath, opt.inputPath, 'oil_').items()):
+        if opt.months and YYYYMM not in opt.months.split(','):
+            continue
         
-        df_info = pd.read_csv(f"{opt.inputPath}/{file}", delimiter=',')
-        df_info.drop(['augbod'], axis=1, inplace=True)
+        # everything but the body
+        df_info = article_store.read_info(opt.storePath, file, YYYYMM, ['Id', 'TimeStamp', 'headline', 'subject'])
         
         df_sent = pd.read_csv(f"{opt.measurePath}/sentiment/{YYYYMM}_sent.csv", delimiter=',')
         df_sent.rename(columns={'sent': 'sentiment'}, inplace=True)
@@ -69,7 +53,7 @@ if __name__ == "__main__":
                     .join(df_entropy['entropy'])\
                     .join(df_total['total'])
         
-        df['TimeStamp_NY'] = df.apply(UTC_to_NY, axis=1)
+        df['TimeStamp_NY'] = session_calendar.to_ny(df['TimeStamp'])
         df.rename(columns={'TimeStamp': 'TimeStamp_UTC'}, inplace=True)
 
         cols = ['Id', 'TimeStamp_UTC', 'TimeStamp_NY', 'subject', 'headline', 'entropy', 'total', 'sentiment', 
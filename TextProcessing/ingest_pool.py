@@ -0,0 +1,55 @@
+"""
+    Function           : Process-pool driver shared by raw_info.py and oil_article_selection.py.
+                         Every month is one job. Outputs are written atomically (temporary file then
+                         rename), so an existing output means the month is complete and a rerun
+                         resumes by skipping it. Throughput is reported in files/s and articles/s.
+"""
+
+import os
+import time
+from multiprocessing import Pool
+from tqdm import tqdm
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def tmp_path(path):
+    return path + '.tmp'
+
+
+def atomic_csv(df, path, **kwargs):
+    """Write df to path so that readers never see a partially written file."""
+    df.to_csv(tmp_path(path), **kwargs)
+    os.replace(tmp_path(path), path)
+
+
+def pending(jobs, overwrite=False):
+    """
+        jobs   : list of (input path, output path, ...) tuples
+        Return : the jobs whose output does not exist yet, largest input first so the pool
+                 does not finish on one long month
+    """
+    todo = [job for job in jobs if overwrite or not os.path.isfile(job[1])]
+    return sorted(todo, key=lambda job: os.path.getsize(job[0]), reverse=True)
+
+
+def run(func, jobs, workers, overwrite=False):
+    """
+        func   : worker, called with one job and returning the number of articles it wrote
+        Return : (files, articles) processed in this run
+    """
+    todo = pending(jobs, overwrite)
+    print(f'{len(jobs) - len(todo)} of {len(jobs)} files already done')
+    start = time.time()
+    files = articles = 0
+    with Pool(workers) as pool:
+        for n in tqdm(pool.imap_unordered(func, todo), total=len(todo)):
+            files += 1
+            articles += n
+    elapsed = max(time.time() - start, 1e-9)
+    print(f'{files} files, {articles} articles in {elapsed:.1f}s: '
+          f'{files/elapsed:.2f} files/s, {articles/elapsed:.0f} articles/s')
+    return files, articles
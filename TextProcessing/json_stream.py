@@ -0,0 +1,80 @@
+"""
+    Function           : Incremental reader for the monthly Thomson Reuters JSON files.
+                         The file is read in fixed-size chunks and the elements of the top-level
+                         'Items' array are yielded as raw JSON text, one at a time, so the caller
+                         can filter an item before decoding it. Memory is bounded by the chunk size
+                         and the largest single item, not by the file size.
+"""
+
+import re
+
+# a complete string, a lone quote (string cut at the end of the buffer) or a bracket
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|"|[{}\[\]]')
+_ARRAY = re.compile(r'\s*(?::\s*(\[)?)?')
+# everything up to the next bracket that is not inside a string
+_SKIP = re.compile(r'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def iter_items(path, key='Items', chunkSize=1 << 20, encoding=None):
+    """Raw JSON text of every element of the top-level `key` array of the file at `path`."""
+    with open(path, encoding=encoding) as f:
+        buf = ''
+        pos = 0            # next position of buf to scan
+        depth = 0          # bracket depth at pos
+        in_items = False   # pos is inside the `key` array
+        start = None       # start of the current item in buf
+        eof = False
+        while True:
+            if depth >= 2:
+                # below the top level only brackets matter: skip strings and values in one match
+                pos = _SKIP.match(buf, pos).end()
+            m = _TOKEN.search(buf, pos)
+            # a token cut at the end of the buffer needs the next chunk
+            need_more = m is None or m.group() == '"'
+            if not need_more:
+                tok = m.group()
+                if tok[0] == '"':
+                    if depth == 1 and not in_items and tok[1:-1] == key:
+                        after = _ARRAY.match(buf, m.end())
+                        if after.end() == len(buf) and not eof:
+                            need_more = True
+                        elif after.group(1):
+                            pos = after.end()
+                            depth += 1
+                            in_items = True
+                            continue
+                    if not need_more:
+                        pos = m.end()
+                        continue
+                elif tok in '{[':
+                    if in_items and depth == 2:
+                        start = m.start()
+                    depth += 1
+                    pos = m.end()
+                    continue
+                else:
+                    depth -= 1
+                    pos = m.end()
+                    if in_items and depth == 2 and start is not None:
+                        yield buf[start:pos]
+                        start = None
+                    elif in_items and depth == 1:
+                        in_items = False
+                    continue
+
+            if eof:
+                return
+            # drop what has been consumed, keep the current item and the unscanned tail
+            keep = start if start is not None else (pos if m is not None else len(buf))
+            buf = buf[keep:]
+            pos = max(pos - keep, 0)
+            if start is not None:
+                start = 0
+            chunk = f.read(chunkSize)
+            eof = not chunk
+            buf += chunk
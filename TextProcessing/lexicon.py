@@ -0,0 +1,57 @@
+"""
+    Function           : Loughran-McDonald word counts of cached token streams (used by sentcode).
+                         The lexicon words are looked up once per distinct token of the month
+                         (hashed set lookups over the month's vocab), and the matches of every article
+                         are then summed over its integer-coded tokens with numpy.
+"""
+
+import re
+import numpy as np
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def read_lm(path):
+    """Word sets of the lexicon sections of 2014.txt: {'NEGATIVE': {...}, 'POSITIVE': {...}, ...}"""
+    sections = {}
+    with open(path, 'r') as f:
+        for l in f:
+            line = re.sub('[^A-Za-z]', ' ', l.strip()).strip()
+            # section headers are the lines that are not indented
+            if not l.startswith('\t'):
+                words = sections.setdefault(line, set())
+            else:
+                words.add(line.lower())
+    return sections
+
+
+class Lexicon(object):
+
+    def __init__(self, positive, negative):
+        self.positive = set(positive)
+        self.negative = set(negative)
+
+    @classmethod
+    def from_file(cls, path):
+        sections = read_lm(path)
+        return cls(sections['POSITIVE'], sections['NEGATIVE'])
+
+    def vocab_scores(self, vocab):
+        """Per vocab entry: is it a positive word, is it a negative word."""
+        vocab = vocab.tolist()
+        return (np.fromiter((t in self.positive for t in vocab), dtype=bool, count=len(vocab)),
+                np.fromiter((t in self.negative for t in vocab), dtype=bool, count=len(vocab)))
+
+    def count(self, month, stream='neg'):
+        """(positive, negative) word counts of every article of a token_cache.MonthTokens."""
+        positive, negative = self.vocab_scores(month.vocab)
+        tokens = month.arrays[f'{stream}_tokens']
+        sent_ptr = month.arrays[f'{stream}_sent_ptr']
+        doc_ptr = month.arrays[f'{stream}_doc_ptr']
+        # article of every token
+        doc = np.repeat(np.arange(len(doc_ptr) - 1), np.diff(sent_ptr[doc_ptr]))
+        return (np.bincount(doc[positive[tokens]], minlength=len(month)),
+                np.bincount(doc[negative[tokens]], minlength=len(month)))
@@ -0,0 +1,337 @@
+#!/user/kh3191/.conda/envs/nlp/bin/python
+
+"""
+    Function           : Live ingestion. Watches a folder for new Reuters JSON files (same layout as
+                         the archive files, {"Items": [...]}) and, for every batch of new items:
+                             selects the English, urgent, energy-tagged articles and keeps the first
+                             article of every PNAC chain not seen before
+                             scores sentiment, word total, entropy (against the rolling n-gram window
+                             the batch run would use for that month) and topic allocation
+                             assigns the oil-session date and adds the articles to the daily sums of
+                             agg_daily.py, then rewrites the daily measures of the affected days
+                         Files must be moved into the folder once complete (write elsewhere, then
+                         rename). The chains seen are kept in a PNAC index (pnac_index.py), started
+                         from the chains of the batch run, and the files processed in --livePath, so
+                         a restarted watcher resumes where it stopped. A file stopped before it is
+                         marked processed is finished without adding it to the daily sums twice.
+"""
+
+import os
+import json
+import time
+import glob
+import bisect
+from functools import partial
+import numpy as np
+import pandas as pd
+
+from json_stream import iter_items
+import ingest_pool
+import article_store
+import token_cache
+import stemming
+import ngram_count
+import sparse_dtm
+import entropy_kernel
+import topics
+import aggregation
+import session_calendar
+import pnac_index
+import ngram_store
+from ngram_store import RollingNgramCounts
+from lexicon import Lexicon
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--watchPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/live/incoming')
+    parser.add_argument('--livePath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/live')
+    parser.add_argument('--pnacIndexPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/live/pnac_index')
+    parser.add_argument('--batchIndexPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/pnac_index',
+           help='PNAC index of oil_article_selection.py, copied into --pnacIndexPath on the first start')
+    parser.add_argument('--ngPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_measure')
+    parser.add_argument('--tokenCachePath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/token_cache')
+    parser.add_argument('--dailySumsPath', type=str, default='NYtime_daily_level_sums_C_2023.csv',
+           help='daily numerator sums written by agg_daily.py, updated in place')
+    parser.add_argument('--dailyMeasuresPath', type=str, default='NYtime_daily_level_measures_C_2023.csv')
+    parser.add_argument('--tagPath', type=str, default='energytag.csv')
+    parser.add_argument('--inputWordsPath', type=str, default='clustering_C.csv')
+    parser.add_argument('--weightColumn', type=str, default='')
+    parser.add_argument('--n_topics', type=int, default=7)
+    parser.add_argument('--sentDicPath', type=str, default='2014.txt')
+    parser.add_argument('--holidayPath', type=str, default='')
+    parser.add_argument('--monthTrials', type=int, default=27)
+    parser.add_argument('--monthWindow', type=int, default=24)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between two looks at --watchPath')
+    parser.add_argument('--once', type=bool, default=False, help='process the files present and exit')
+    opt = parser.parse_args()
+    return opt
+
+opt = parse_option()
+print(opt)
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def read_articles(path):
+    """Articles of a raw file passing the language/urgency filter of raw_info.gen_info."""
+    rows = []
+    for raw in iter_items(path):
+        item = json.loads(raw)
+        data = item['data']
+        if data['language'] != 'en' or int(data['urgency']) < 2:
+            continue
+        headline, body = data['headline'], data['body']
+        augbod = headline + body if body is not None and headline is not None else (body if body is not None else headline)
+        if augbod is None:
+            continue
+        rows.append((data['id'], item['timestamps'][0]['timestamp'], data['altId'], headline, data['subjects'], augbod))
+    return pd.DataFrame(rows, columns=['Id', 'TimeStamp', 'PNAC', 'headline', 'subject', 'augbod'])
+
+
+class LiveState(object):
+    """PNAC chains already ingested (pnac_index.PnacIndex) and files already processed (text file in livePath)."""
+
+    def __init__(self, livePath, indexPath, batchIndexPath=''):
+        os.makedirs(livePath, exist_ok=True)
+        if not os.path.isfile(f'{indexPath}/table.npy') and batchIndexPath:
+            # chains of the batch months, so revisions of archived stories are not taken as new
+            pnac_index.rebuild(indexPath, pnac_index.indexed_months(batchIndexPath), batchIndexPath)
+        self.index = pnac_index.PnacIndex(indexPath)
+        self.files_path = f'{livePath}/files_processed.txt'
+        self.files = self._read(self.files_path)
+        self.pending_path = f'{livePath}/file_pending.txt'
+
+    @staticmethod
+    def _read(path):
+        if not os.path.isfile(path):
+            return set()
+        with open(path) as f:
+            return set(f.read().split('\n')) - {''}
+
+    @staticmethod
+    def _append(path, lines):
+        with open(path, 'a') as f:
+            f.writelines(f'{line}\n' for line in lines)
+
+    @staticmethod
+    def _stamp(path):
+        if not os.path.isfile(path):
+            return ''
+        st = os.stat(path)
+        return f'{st.st_size}:{st.st_mtime_ns}:{st.st_ino}'
+
+    def begin(self, file, articlesPath, sumsPath):
+        """Record the file about to change the outputs, with the size of the article file and the stamp of the sums before it."""
+        size = os.path.getsize(articlesPath) if os.path.isfile(articlesPath) else 0
+        tmp_path = self.pending_path[:-len('.txt')] + '.tmp.txt'
+        with open(tmp_path, 'w') as f:
+            f.write(f'{file}\n{size}\n{self._stamp(sumsPath)}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pending_path)
+
+    def recover(self, articlesPath, sumsPath):
+        """
+            File stopped between begin() and commit(). Its articles are appended before the sums are
+            written, so if the sums changed since begin() the file only has to be committed (return it);
+            otherwise the article rows it appended are cut off and it is processed again (return None).
+        """
+        if not os.path.isfile(self.pending_path):
+            return None
+        with open(self.pending_path) as f:
+            file, size, stamp = f.read().split('\n')[:3]
+        if file in self.files:
+            return None
+        if self._stamp(sumsPath) != stamp:
+            return file
+        if os.path.isfile(articlesPath):
+            with open(articlesPath, 'ab') as f:
+                f.truncate(int(size))
+        return None
+
+    def select(self, df, energyq):
+        """
+            Energy-tagged articles, first of their PNAC chain (oil_article_selection.py) and of a chain not seen before.
+            Return : articles sorted by PNAC, their chain entries (for commit)
+        """
+        df = df[[not energyq.isdisjoint(s) for s in df['subject']]]
+        df = df[df['PNAC'].notnull()]
+        entries = pnac_index.chains(df['PNAC'], df['TimeStamp'], df['Id'],
+                                    df['TimeStamp'].str[:4] + df['TimeStamp'].str[5:7])
+        entries = entries[self.index.find(entries['key']) < 0]
+        df = df[np.isin(pnac_index.hashes(df['Id']), entries['id'])]
+        df = df.sort_values('TimeStamp', kind='stable').drop_duplicates('PNAC')
+        return df.sort_values('PNAC', kind='stable').reset_index(drop=True), entries
+
+    def commit(self, file, entries):
+        self.index.merge(entries)
+        self.index.flush()
+        self._append(self.files_path, [file])
+        self.files.add(file)
+        if os.path.isfile(self.pending_path):
+            os.remove(self.pending_path)
+
+
+class Scorer(object):
+    """Article measures of a batch, computed as sentcode.py, entropy.py, dtm.py and topic_allocation.py do."""
+
+    def __init__(self, opt):
+        self.opt = opt
+        self.lexicon = Lexicon.from_file(opt.sentDicPath)
+        words = pd.read_csv(opt.inputWordsPath, sep=',').word.tolist()
+        self.index = sparse_dtm.vocab_index(words)
+        self.membership = topics.membership_matrix(topics.read_topics(opt.inputWordsPath, opt.weightColumn),
+                                                   words, opt.n_topics)
+        self.hashed = None
+        self.window_month = None
+        self.window_ok = False
+        stemming.get_stemmer('snowball').load(stemming.cache_path(opt.tokenCachePath, 'snowball'))
+
+    def set_window(self, YYYYMM):
+        """
+            Window of entropy.py for the month. The n-gram months of ngram.py are globbed again when the
+            month changes, so months added by the batch run are used. False (entropy NaN) if the month
+            has fewer than monthTrials months before it, if these are not the calendar months before it
+            (the batch run will position the window on months not yet counted), or if the window is
+            short of monthWindow months with 3gram and 4gram counts.
+        """
+        if YYYYMM == self.window_month:
+            return self.window_ok
+        self.window_month, self.window_ok = YYYYMM, False
+        ngr = {n: ngram_store.month_files(self.opt.ngPath, n) for n in [3, 4]}
+        months = sorted(ngr[4])
+        fnum = bisect.bisect_left(months, YYYYMM)
+        before = pd.period_range(end=pd.Period(f'{YYYYMM[:4]}-{YYYYMM[4:]}', 'M') - 1,
+                                 periods=self.opt.monthTrials, freq='M').strftime('%Y%m').tolist()
+        if fnum < self.opt.monthTrials or months[fnum-self.opt.monthTrials:fnum] != before:
+            return False
+        window = months[fnum-self.opt.monthTrials:fnum-self.opt.monthTrials+self.opt.monthWindow]
+        if len(window) < self.opt.monthWindow or any(m not in ngr[3] for m in window):
+            return False
+        # keyed by hash when ngram.py wrote binary counts; a change of keys starts the windows again
+        hashed = any(f.endswith('.npz') for f in ngr[4].values())
+        if hashed != self.hashed:
+            reader = partial(ngram_store.read_month_counts, hashed=hashed)
+            self.stop = {n: RollingNgramCounts(reader) for n in [3, 4]}
+            self.hashed = hashed
+        for n in [3, 4]:
+            self.stop[n].set_window(ngram_store.window_files(ngr[n], window))
+        self.window_ok = True
+        return True
+
+    def entropy(self, month, YYYYMM):
+        if not self.set_window(YYYYMM):
+            return np.full(len(month), np.nan)
+        grams = entropy_kernel.grams_from_month(month, 'sent', self.hashed)
+        return entropy_kernel.month_entropy(*grams, self.stop[3], self.stop[4], len(month))
+
+    def allocation(self, month):
+        batches = []
+        for stream, orders in [('doc', (1,)), ('sent', (2, 3))]:
+            batch, grams = ngram_count.extract(month, stream, orders)
+            batches.append((batch, grams, sparse_dtm.gram_columns(self.index, month.vocab, grams)))
+        dtm = sparse_dtm.from_batches(batches, len(month), len(self.index))
+        return topics.allocation_frame(topics.allocate(dtm, self.membership))
+
+    def score_month(self, df, YYYYMM):
+        # sentcode.py reads the text with the encoding of its configuration (ISO-8859-1)
+        config = token_cache.CONFIGS['sentiment']
+        sent = token_cache.MonthTokens.from_text(article_store.decoded(df, config['encoding']), config)
+        pos, neg = self.lexicon.count(sent, 'neg')
+        total = sent.total()
+        # dtm and entropy share the snowball configuration
+        month = token_cache.MonthTokens.from_text(df, token_cache.CONFIGS['entropy'])
+        out = pd.DataFrame({'Id': df['Id'], 'TimeStamp_UTC': df['TimeStamp'],
+                            'TimeStamp_NY': session_calendar.to_ny(df['TimeStamp']),
+                            'subject': df['subject'].map(str), 'headline': df['headline'],
+                            'entropy': self.entropy(month, YYYYMM), 'total': total, 'sentiment': (pos - neg) / total})
+        return pd.concat([out, self.allocation(month)], axis=1)
+
+    def score(self, df):
+        """Article level measures in the layout of info.py, one row per article of df."""
+        YYYYMM = df['TimeStamp'].str[:4] + df['TimeStamp'].str[5:7]
+        return pd.concat([self.score_month(part.reset_index(drop=True), m) for m, part in df.groupby(YYYYMM)],
+                         ignore_index=True)
+
+
+class DailyMeasures(object):
+    """Daily sums of agg_daily.py, updated with new articles; the measures are rewritten from the sums."""
+
+    def __init__(self, sumsPath, measuresPath, holidays=None):
+        self.sumsPath = sumsPath
+        self.measuresPath = measuresPath
+        self.holidays = holidays
+        self.sums = pd.read_csv(sumsPath, index_col='date') if os.path.isfile(sumsPath) else None
+
+    def add(self, measures):
+        """Add article level measures; return them with their date ('weekend' articles dropped)."""
+        measures = measures.assign(date=session_calendar.oil_date(measures['TimeStamp_NY'], self.holidays))
+        measures = measures[measures['date'] != 'weekend'].astype({'date': np.int64})
+        df = aggregation.prepare(measures)
+        if len(df):
+            sums = aggregation.bucket_sums(aggregation.numerators(df, aggregation.topic_count(df)), df['date'])
+            if self.sums is not None:
+                sums = self.sums.add(sums, fill_value=0).astype(self.sums.dtypes.to_dict())
+            self.sums = sums.sort_index()
+        return measures
+
+    def write(self):
+        if self.sums is None:
+            return
+        ingest_pool.atomic_csv(self.sums, self.sumsPath)
+        ingest_pool.atomic_csv(aggregation.ratios(self.sums), self.measuresPath)
+
+
+def process(file, state, scorer, daily, energyq, articlesPath, applied=False):
+    """applied : the articles and daily sums of the file were written before an interruption (LiveState.recover)"""
+    start = time.time()
+    df, entries = state.select(read_articles(file), energyq)
+    if len(df) and not applied:
+        state.begin(os.path.basename(file), articlesPath, daily.sumsPath)
+        measures = daily.add(scorer.score(df))
+        header = not os.path.isfile(articlesPath) or os.path.getsize(articlesPath) == 0
+        measures.to_csv(articlesPath, mode='a', header=header, index=False)
+        daily.write()
+    state.commit(os.path.basename(file), entries)
+    elapsed = time.time() - start
+    print(f'{os.path.basename(file)}: {len(df)} articles in {elapsed*1000:.0f}ms '
+          f'({elapsed*1000/max(len(df), 1):.1f}ms per article)', flush=True)
+
+
+def main():
+    energyq = pd.read_csv(opt.tagPath, sep=',').energytag.tolist()
+    energyq = set(map(lambda x: 'N2:'+x.upper(), energyq))
+    holidays = session_calendar.read_holidays(opt.holidayPath) if opt.holidayPath else None
+
+    state = LiveState(opt.livePath, opt.pnacIndexPath, opt.batchIndexPath)
+    scorer = Scorer(opt)
+    daily = DailyMeasures(opt.dailySumsPath, opt.dailyMeasuresPath, holidays)
+    articlesPath = f'{opt.livePath}/live_article_level_measures.csv'
+    applied = state.recover(articlesPath, opt.dailySumsPath)
+    if applied:
+        # the measures may not have been rewritten from the sums
+        daily.write()
+
+    while True:
+        files = sorted((f for f in glob.glob(f'{opt.watchPath}/*.json') if os.path.basename(f) not in state.files),
+                       key=os.path.getmtime)
+        for file in files:
+            process(file, state, scorer, daily, energyq, articlesPath, os.path.basename(file) == applied)
+        if opt.once:
+            break
+        time.sleep(opt.interval)
+
+
+if __name__ == '__main__':
+    main()
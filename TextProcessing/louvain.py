@@ -0,0 +1,114 @@
+#!/user/kh3191/.conda/envs/nlp/bin/python
+
+"""
+    Function           : Louvain clustering of the cosine similarity of the words (replaces louvain.R).
+                         The similarity is computed in memory from the Gram matrix of cosine.py
+                         (gram.npz), so no cosine.csv is read. For every resolution, --restarts runs
+                         with different random node orders are spread over --workers processes and
+                         the run with the best modularity is kept, as louvain.R keeps the best of its
+                         1000 word shufflings.
+                         Output: one topic file per resolution in the layout of clustering_C.csv
+                         (word, Topic, freq; topics numbered by total frequency, words by frequency)
+                         and louvain_runs.csv with the modularity and number of topics of every run.
+                         Words that never occur in the months of the Gram matrix are left out.
+                         With --neighboursPath the graph is the top-k neighbour graph of cosine.py --topK
+                         instead (made symmetric: an edge if either word is a neighbour of the other),
+                         for vocabularies too large for the Gram matrix.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from tqdm import tqdm
+
+import cosine_neighbours
+import louvain_kernel
+from gram_matrix import GramMatrix
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--gramPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/cosine/gram.npz',
+           help='Gram matrix written by cosine.py (its --startMonth/--endMonth set the sample window)')
+    parser.add_argument('--neighboursPath', type=str, default='',
+           help='top-k neighbour graph written by cosine.py --topK (.../cosine/cosine_top{k}.npz) instead of --gramPath')
+    parser.add_argument('--outputPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/Louvain')
+    parser.add_argument('--resolutions', type=str, default='1',
+           help='comma separated modularity resolutions, e.g. 0.8,1,1.2 (1 is louvain.R)')
+    parser.add_argument('--restarts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first restart')
+    parser.add_argument('--minSimilarity', type=float, default=0.0, help='drop the edges below this cosine similarity')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    opt = parser.parse_args()
+    return opt
+
+opt = parse_option()
+print(opt)
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def init_worker(graph):
+    global GRAPH
+    GRAPH = graph
+
+
+def run(task):
+    resolution, seed = task
+    labels, q = louvain_kernel.louvain(GRAPH, resolution, seed)
+    return resolution, seed, q, labels
+
+
+def topic_table(words, freq, labels):
+    """word, Topic, freq with topics numbered 1.. by total frequency and words sorted by frequency."""
+    df = pd.DataFrame({'word': words, 'label': labels, 'freq': freq})
+    rank = df.groupby('label')['freq'].sum().sort_values(ascending=False, kind='stable')
+    df['Topic'] = df['label'].map({label: i + 1 for i, label in enumerate(rank.index)})
+    df = df.sort_values(['Topic', 'freq'], ascending=[True, False], kind='stable')
+    return df[['word', 'Topic', 'freq']]
+
+
+def main():
+    if opt.neighboursPath:
+        all_words, totals, similarity = cosine_neighbours.load(opt.neighboursPath)
+        similarity = similarity.maximum(similarity.T).tocsr()
+        print(f'Neighbour graph of {len(all_words)} words, {similarity.nnz} edges')
+    else:
+        gram = GramMatrix.load(opt.gramPath)
+        print(f'Gram matrix of {len(gram.months)} months ({min(gram.months, default="")}-{max(gram.months, default="")})')
+        all_words, totals, similarity = gram.words, gram.totals, gram.cosine()
+    used = totals > 0
+    words = np.asarray(all_words)[used]
+    print(f'{len(words)} of {len(all_words)} words occur')
+    graph = louvain_kernel.adjacency(similarity[used][:, used], opt.minSimilarity)
+
+    resolutions = [float(r) for r in opt.resolutions.split(',')]
+    tasks = [(r, opt.seed + i) for r in resolutions for i in range(opt.restarts)]
+    best = {}
+    runs = []
+    with Pool(opt.workers, initializer=init_worker, initargs=(graph,)) as pool:
+        for resolution, seed, q, labels in tqdm(pool.imap_unordered(run, tasks, chunksize=8), total=len(tasks)):
+            runs.append((resolution, seed, q, labels.max() + 1))
+            # ties go to the smaller seed, so the result does not depend on the scheduling
+            if resolution not in best or (q, -seed) > (best[resolution][0], -best[resolution][1]):
+                best[resolution] = (q, seed, labels)
+
+    os.makedirs(opt.outputPath, exist_ok=True)
+    runs = pd.DataFrame(runs, columns=['resolution', 'seed', 'modularity', 'n_topics']).sort_values(['resolution', 'seed'])
+    runs.to_csv(f'{opt.outputPath}/louvain_runs.csv', index=False)
+    for resolution in resolutions:
+        q, seed, labels = best[resolution]
+        table = topic_table(words, totals[used], labels)
+        table.to_csv(f'{opt.outputPath}/clustering_res{resolution:g}.csv', index=False)
+        print(f'resolution {resolution:g}: modularity {q:.6f} (seed {seed}), topic sizes {table.Topic.value_counts(sort=False).tolist()}')
+
+
+if __name__ == '__main__':
+    main()
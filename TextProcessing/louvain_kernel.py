@@ -0,0 +1,104 @@
+"""
+    Function           : Louvain community detection on a weighted undirected graph (the word cosine
+                         similarities), as igraph's cluster_louvain called by louvain.R.
+                         Modularity with resolution g, for weights w, degrees k and 2m = sum of w:
+                             Q = 1/2m * sum_ij (w_ij - g * k_i * k_j / 2m) * [c_i == c_j]
+                         Local moving: nodes are visited in a random order and moved to the
+                         neighbouring community with the largest gain k_i,c - g * k_i * tot_c / 2m
+                         (k_i,c summed into a scratch array, so a node costs O(degree))
+                         until no node moves; the communities are then merged into nodes
+                         (W' = M^T W M) and the moving starts again, until nothing changes.
+                         The random order is the only randomness, so a restart is a seed.
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def adjacency(similarity, min_similarity=0.0):
+    """Symmetric CSR graph of a similarity matrix without the diagonal (graph.adjacency(diag=FALSE))."""
+    graph = sparse.csr_matrix(similarity, dtype=np.float64)
+    graph.setdiag(0)
+    if min_similarity > 0:
+        graph.data[graph.data < min_similarity] = 0
+    graph.eliminate_zeros()
+    return graph
+
+
+def modularity(graph, labels, resolution=1.0):
+    graph = sparse.csr_matrix(graph)
+    two_m = graph.sum()
+    if two_m == 0:
+        return 0.0
+    degree = np.asarray(graph.sum(axis=1)).ravel()
+    member = sparse.csr_matrix((np.ones(len(labels)), (np.arange(len(labels)), labels)))
+    inside = (member.T @ graph @ member).diagonal().sum()
+    tot = np.bincount(labels, weights=degree)
+    return inside / two_m - resolution * np.sum((tot / two_m) ** 2)
+
+
+def move_nodes(graph, resolution, rng):
+    """One level of local moving; return the community of every node (0..k-1) and whether any node moved."""
+    n = graph.shape[0]
+    indptr, indices, data = graph.indptr, graph.indices, graph.data
+    self_loops = graph.diagonal()
+    degree = np.asarray(graph.sum(axis=1)).ravel()
+    two_m = degree.sum()
+    labels = np.arange(n)
+    tot = degree.copy()
+    # weight from the node being moved to every community, cleared after each node (O(degree) per node)
+    k_in = np.zeros(n)
+    moved_any = False
+    while True:
+        moved = 0
+        for i in rng.permutation(n):
+            communities = labels[indices[indptr[i]:indptr[i+1]]]
+            own = labels[i]
+            tot[own] -= degree[i]
+            np.add.at(k_in, communities, data[indptr[i]:indptr[i+1]])
+            # self-loop excluded
+            k_in[own] -= self_loops[i]
+            stay = k_in[own] - resolution * degree[i] * tot[own] / two_m
+            gain = k_in[communities] - resolution * degree[i] * tot[communities] / two_m
+            k_in[communities] = 0
+            k_in[own] = 0
+            # stay on ties, else the smallest community of the largest gain
+            best = own
+            if len(gain) and gain.max() > stay:
+                best = communities[gain == gain.max()].min()
+            tot[best] += degree[i]
+            if best != own:
+                labels[i] = best
+                moved += 1
+        moved_any = moved_any or moved > 0
+        if moved == 0:
+            break
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels, moved_any
+
+
+def louvain(graph, resolution=1.0, seed=0):
+    """
+        graph  : symmetric CSR weights (adjacency)
+        Return : community of every node (0..k-1, numbered by first node), modularity
+    """
+    rng = np.random.default_rng(seed)
+    graph = sparse.csr_matrix(graph)
+    labels = np.arange(graph.shape[0])
+    level = graph
+    while level.shape[0] > 1:
+        level_labels, moved = move_nodes(level, resolution, rng)
+        if not moved:
+            break
+        labels = level_labels[labels]
+        member = sparse.csr_matrix((np.ones(level.shape[0]), (np.arange(level.shape[0]), level_labels)))
+        level = sparse.csr_matrix(member.T @ level @ member)
+    _, first = np.unique(labels, return_index=True)
+    order = np.argsort(np.argsort(first))
+    labels = order[labels]
+    return labels, modularity(graph, labels, resolution)
@@ -0,0 +1,171 @@
+"""
+    Function           : Hashed n-gram counting on integer token streams (token_cache.MonthTokens).
+                         An n-gram is keyed by a 64-bit hash folded from per-token hashes, so keys
+                         agree across months without a global vocabulary, and the hash of a
+                         4-gram's 3-gram prefix is the intermediate value of the fold.
+                         extract() takes every requested n-gram order from one sweep over a token
+                         stream as a batch of (doc, order, gram id) records; dtm, ngram and entropy
+                         all start from it. Counts are written as binary .npz files (hash, int32
+                         freq and the token rows for CSV export). Collisions are checked within a
+                         month when counting; every file also keeps a second hash of its n-grams,
+                         folded from differently keyed token hashes, so that the rolling window of
+                         ngram_store.py can check that months agreeing on a hash agree on the n-gram.
+"""
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+# one n-gram occurrence: article, order and id of the n-gram among the distinct ones of that order
+BATCH = np.dtype([('doc', np.int32), ('order', np.int8), ('gram', np.int32)])
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def token_hashes(vocab, person=b''):
+    """Stable 64-bit hash of every token string (independent of the process and of the month)."""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8, person=person).digest(), 'little')
+                        for t in vocab), dtype=np.uint64, count=len(vocab))
+
+
+def check_hashes(grams, vocab):
+    """Second hash of the n-grams (token rows x n), independent of the key hash (never 0)."""
+    if len(grams) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    h = fold(token_hashes(vocab, b'ngram-check')[grams], grams.shape[1])
+    h[h == 0] = 1
+    return h
+
+
+def fold(hashes, columns):
+    """Hash of the n-grams whose token hashes are the columns of `hashes` (rows x n)."""
+    h = np.zeros(len(hashes), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for j in range(columns):
+            h = h * _MULT + hashes[:, j]
+    return h
+
+
+def key_hashes(keys):
+    """Hash of '.'-joined string n-gram keys, equal to the hash of the same tokens in a stream."""
+    memo = {}
+    out = np.empty(len(keys), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i, key in enumerate(keys):
+            h = np.uint64(0)
+            for token in key.split('.'):
+                th = memo.get(token)
+                if th is None:
+                    th = memo[token] = token_hashes([token])[0]
+                h = h * _MULT + th
+            out[i] = h
+    return out
+
+
+def extract(month, stream, orders=(3, 4)):
+    """
+        Every n-gram of the requested orders in one sweep over the month's token stream; n-grams do
+        not cross sentence ends.
+        Return : (batch, grams)
+                 batch : one record (doc, order, gram) per n-gram occurrence, gram indexing grams[order]
+                 grams : order -> distinct n-grams as token id rows (distinct x order)
+    """
+    tokens = month.arrays[f'{stream}_tokens']
+    sent_ptr = month.arrays[f'{stream}_sent_ptr']
+    doc_ptr = month.arrays[f'{stream}_doc_ptr']
+    sent_of = np.repeat(np.arange(len(sent_ptr)-1), np.diff(sent_ptr))
+    doc_of = np.repeat(np.arange(len(doc_ptr)-1), np.diff(doc_ptr))[sent_of]
+    # tokens left in the sentence from every position: an n-gram starts where this is >= n
+    remaining = sent_ptr[sent_of + 1] - np.arange(len(tokens))
+
+    parts, grams = [], {}
+    for n in orders:
+        starts = np.nonzero(remaining >= n)[0]
+        grams[n], ids = factorize_rows(tokens, starts, n, len(month.vocab))
+        part = np.empty(len(starts), dtype=BATCH)
+        part['doc'] = doc_of[starts]
+        part['order'] = n
+        part['gram'] = ids.reshape(-1)
+        parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=BATCH), grams
+
+
+def row_codes(columns, n_tokens):
+    """
+        Id of every row of token ids given column by column; equal rows get equal ids.
+        Rows are factorized one column at a time on int64 keys (id of the prefix * n_tokens + token),
+        which never overflows and is much faster than np.unique(axis=0).
+    """
+    ids = None
+    for column in columns:
+        key = column.astype(np.int64) if ids is None else ids * n_tokens + column
+        ids, _ = pd.factorize(key)
+    return ids
+
+
+def factorize_rows(tokens, starts, n, n_tokens):
+    """Distinct n-grams starting at `starts` (order of first occurrence) and the id of every occurrence."""
+    ids = row_codes((tokens[starts + j] for j in range(n)), n_tokens)
+    first = np.empty(ids.max() + 1 if len(ids) else 0, dtype=np.int64)
+    first[ids[::-1]] = np.arange(len(ids))[::-1]
+    return tokens[starts[first][:, None] + np.arange(n)].reshape(-1, n), ids
+
+
+def order_batch(batch, n):
+    """(doc, gram) of the occurrences of order n."""
+    part = batch[batch['order'] == n]
+    return part['doc'], part['gram']
+
+
+def count(batch, grams, n, th):
+    """
+        batch, grams : output of extract
+        th           : hash of every token id
+        Return       : (hash, freq, rows) of the distinct n-grams of order n
+    """
+    _, ids = order_batch(batch, n)
+    freq = np.bincount(ids, minlength=len(grams[n]))
+    h = fold(th[grams[n]], n)
+    # two different token rows of the month with the same hash would be merged: refuse to write them
+    # (across months the window checks the second hash, see check_hashes)
+    if len(np.unique(h)) != len(h):
+        raise ValueError('64-bit n-gram hash collision')
+    return h, freq.astype(np.int32), grams[n].astype(np.int32)
+
+
+def count_month(month, stream, orders=(3, 4)):
+    """Count every n-gram order in one pass over the month's token stream."""
+    th = token_hashes(month.vocab)
+    batch, grams = extract(month, stream, orders)
+    return {n: count(batch, grams, n, th) for n in orders}
+
+
+def write_counts(path, counts, vocab):
+    hashes, freq, grams = counts
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path, hash=hashes, freq=freq, grams=grams, vocab=np.asarray(vocab, dtype=str),
+                        check=check_hashes(grams, vocab))
+    os.replace(tmp_path, path)
+
+
+def read_counts(path):
+    """(keys, freq, check hashes) of a binary count file, keyed by hash; reader for ngram_store.RollingNgramCounts."""
+    with np.load(path) as f:
+        # files written before the check hashes are merged unchecked
+        check = f['check'] if 'check' in f.files else None
+        return f['hash'].tolist(), f['freq'].astype(np.int64), check
+
+
+def to_frame(path):
+    """Binary count file in the layout of the old {YYYYMM}_{n}gram.csv files (word, freq)."""
+    with np.load(path) as f:
+        vocab = f['vocab']
+        words = ['.'.join(row) for row in vocab[f['grams']].tolist()]
+        return pd.DataFrame({'word': words, 'freq': f['freq']})
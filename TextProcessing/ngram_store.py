@@ -0,0 +1,142 @@
+"""
+    Function           : Rolling-window n-gram counts for entropy.py.
+                         Each monthly n-gram file is read once. The window moves by adding the
+                         new month and subtracting the expiring one from an integer count array.
+                         N-gram keys are interned to ids, and ids are reused once their window
+                         count drops back to 0. For hashed keys with a check hash (ngram_count.py)
+                         a key met again in another month must come with the same check hash, so a
+                         64-bit collision across the months of the window is an error.
+                         Month files are keyed by YYYYMM: a month is read from its binary .npz counts
+                         when ngram.py wrote them and from the older csv counts otherwise (the csv
+                         keys hashed when the window is keyed by hash).
+"""
+
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+import ngram_count
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def read_csv_counts(path):
+    """Monthly n-gram file written by ngram.py: (keys, freq, no check hashes)."""
+    df = pd.read_csv(path, index_col=0)
+    return df['word'].tolist(), df['freq'].to_numpy(dtype=np.int64), None
+
+
+def month_files(ngPath, n):
+    """YYYYMM -> n-gram file of the month, the binary .npz counts where there are also csv counts."""
+    files = {}
+    for ext in ['csv', 'npz']:
+        for path in glob.glob(f'{ngPath}/{n}gram/*_{n}gram.{ext}'):
+            files[os.path.basename(path)[:6]] = path
+    return files
+
+
+def read_month_counts(path, hashed=True):
+    """Reader of a month file by its format; csv keys are hashed as the .npz keys when hashed."""
+    if path.endswith('.npz'):
+        return ngram_count.read_counts(path)
+    keys, freq, check = read_csv_counts(path)
+    return (ngram_count.key_hashes(keys).tolist() if hashed else keys), freq, check
+
+
+def window_files(files, months):
+    """Files of the window months (month_files), every month of the window must have one."""
+    missing = [m for m in months if m not in files]
+    if missing:
+        raise FileNotFoundError(f'no n-gram counts for the window months {missing}')
+    return [files[m] for m in months]
+
+
+class RollingNgramCounts(object):
+    """Dict-like view (get / []) of the summed counts of the months in the current window."""
+
+    def __init__(self, reader=read_csv_counts):
+        self.reader = reader
+        self.index = {}
+        self.keys = []
+        self.free = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        # check hash of every id (0: none)
+        self.check = np.zeros(0, dtype=np.uint64)
+        # file -> (ids, freq) of every month currently in the window
+        self.months = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def get(self, key, default=0):
+        i = self.index.get(key)
+        return default if i is None else int(self.counts[i])
+
+    def lookup(self, ids):
+        """Counts of interned ids; -1 (unknown key) gives 0."""
+        ids = np.asarray(ids)
+        return np.where(ids >= 0, self.counts[np.maximum(ids, 0)], 0)
+
+    def ids(self, keys):
+        """Ids of keys, -1 for keys not in the window."""
+        return np.fromiter((self.index.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+
+    def _intern(self, keys):
+        ids = np.empty(len(keys), dtype=np.int64)
+        for n, key in enumerate(keys):
+            i = self.index.get(key)
+            if i is None:
+                if self.free:
+                    i = self.free.pop()
+                    self.keys[i] = key
+                else:
+                    i = len(self.keys)
+                    self.keys.append(key)
+                self.index[key] = i
+            ids[n] = i
+        if len(self.keys) > len(self.counts):
+            grown = np.zeros(max(len(self.keys), 2*len(self.counts)), dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+            check = np.zeros(len(grown), dtype=np.uint64)
+            check[:len(self.check)] = self.check
+            self.check = check
+        return ids
+
+    def add(self, file):
+        keys, freq, check = self.reader(file)
+        ids = self._intern(keys)
+        if check is not None:
+            known = self.check[ids]
+            clash = (known != 0) & (known != check)
+            if clash.any():
+                raise ValueError(f'{file}: 64-bit n-gram hash collision with another month of the window')
+            self.check[ids] = check
+        np.add.at(self.counts, ids, freq)
+        self.months[file] = (ids, freq)
+
+    def subtract(self, file):
+        ids, freq = self.months.pop(file)
+        np.subtract.at(self.counts, ids, freq)
+        for i in np.unique(ids[self.counts[ids] == 0]):
+            del self.index[self.keys[i]]
+            self.keys[i] = None
+            self.check[i] = 0
+            self.free.append(i)
+
+    def set_window(self, files):
+        """Move the window to `files`, reading only the months that enter it."""
+        files = list(files)
+        for file in [f for f in self.months if f not in files]:
+            self.subtract(file)
+        for file in files:
+            if file not in self.months:
+                self.add(file)
+        return self
@@ -0,0 +1,165 @@
+"""
+    Function           : Shared text normalizer used by utils, dtm, ngram and token_cache.
+                         get_clean0 returns the same output as the original sequence of
+                         re.sub calls, but runs the entity and number substitutions as one
+                         compiled alternation and filters the tokens in a single scan.
+"""
+
+import re
+from nltk.corpus import stopwords
+
+STOPWORDS = frozenset(stopwords.words('english'))
+
+
+########################################################
+#
+# Patterns
+#
+########################################################
+_PARENS = re.compile(r'\(.*?\)')
+_ANGLES = re.compile(r'<.*?>')
+_EXCHANGES = re.compile('CBOT|CHICAGO BOARD OF TRADE|CHICAGO MERCANTILE EXCHANGE|CME')
+
+# Entity substitutions in the order the original get_clean0 applied them.
+ENTITIES = [
+    ('s&p', 'snp'),
+    ('s & p', 'snp'),
+    (r"standard[\s]&[\s]poor's", 'snp'),
+    (r"standard[\s]and[\s]poor's", 'snp'),
+    (r'snp[\s]500', 'snp500'),
+    (r'dow[\s]jones[\s]industrial[\s]average', 'djia'),
+    (r'new[\s]york[\s]stock[\s]exchange', 'nyse'),
+    (r'london[\s]stock[\s]exchange', 'ftse'),
+    (r'stock[\s]exchange[\s]of[\s]hong[\s]kong', 'sehk'),
+    (r'australian[\s]stock[\s]exchange', 'asx'),
+    (r'fannie[\s]mae', 'fnma'),
+    (r'freddie[\s]mac', 'fdmc'),
+    (r'federal[\s]reserve', 'fed'),
+    (r'securities[\s]and[\s]exchange[\s]commission', 'sec'),
+    (r'chief[\s]executive[\s]officer', 'ceo'),
+    (r'chief[\s]financial[\s]officer', 'cfo'),
+    (r'chief[\s]operating[\s]officer', 'coo'),
+    (r'chief[\s]investment[\s]officer', 'cio'),
+    (r'vice[\s]president', 'vp'),
+    (r'international[\s]monetary[\s]fund', 'imf'),
+]
+
+NUMBERS = [
+    ('[0-9]{9}[0-9]+', ' _bn_ '),
+    ('[0-9]{6}[0-9]+', ' _mn_ '),
+    (r'_n_[\s]+billion', ' _bn_ '),
+    (r'_n_[\s]+million', ' _mn_ '),
+]
+
+_SEQUENTIAL = [(re.compile(p), r) for p, r in ENTITIES + NUMBERS]
+
+# All entities as one alternation. The replacement is looked up by the matched text with
+# its whitespace collapsed. Two chains of the sequential version are spelled out:
+#   * 's&p 500' (and the other S&P spellings) become 'snp500',
+#   * 'stock exchange of hong kong' is replaced before 'australian stock exchange'.
+# The branches are left without capture groups so the regex engine can skip ahead on
+# their first characters.
+_SNP = r"(?:s&p|s & p|standard[\s]&[\s]poor's|standard[\s]and[\s]poor's|snp)(?:[\s]500)?"
+_ASX_SEHK = r'australian[\s]stock[\s]exchange[\s]of[\s]hong[\s]kong'
+
+_LOOKUP = {}
+for pattern, replacement in ENTITIES[:4]:
+    key = pattern.replace(r'[\s]', ' ')
+    _LOOKUP[key] = 'snp'
+    _LOOKUP[key + ' 500'] = 'snp500'
+_LOOKUP['snp'] = 'snp'
+_LOOKUP['snp 500'] = 'snp500'
+for pattern, replacement in ENTITIES[5:]:
+    _LOOKUP[pattern.replace(r'[\s]', ' ')] = replacement
+
+_ENTITY_RE = re.compile('|'.join([_SNP, _ASX_SEHK] + [p for p, _ in ENTITIES[5:]]))
+_DIGITS_RE = re.compile('[0-9]{7,}')
+_N_RE = re.compile(r'_n_[\s]+(?:billion|million)')
+
+# Characters that can extend an entity match into its neighbour. A match touching one of
+# these may overlap or chain with another entity, so that text is handled sequentially.
+_GLUE = frozenset("abcdefghijklmnopqrstuvwxyz&'")
+
+_WORD = re.compile('[a-z]+').fullmatch
+_NON_ALPHA = re.compile('[^a-z]+')
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def _digits(m):
+    return ' _bn_ ' if m.end() - m.start() >= 10 else ' _mn_ '
+
+
+def _n_unit(m):
+    return ' _bn_ ' if m.group().endswith('billion') else ' _mn_ '
+
+
+def substitute_sequential(sample):
+    """Reference implementation: one re.sub per entity, in order."""
+    for pattern, replacement in _SEQUENTIAL:
+        sample = pattern.sub(replacement, sample)
+    return sample
+
+
+def substitute(sample):
+    """Apply the entity and number substitutions to the lower-cased text."""
+    pieces = []
+    last = 0
+    n = len(sample)
+    for m in _ENTITY_RE.finditer(sample):
+        start, end = m.span()
+        if (start > 0 and sample[start-1] in _GLUE) or (end < n and sample[end] in _GLUE):
+            return substitute_sequential(sample)
+        text = m.group()
+        key = ' '.join(text.split())
+        if key == 'australian stock exchange of hong kong':
+            replacement = 'australian' + text[10] + 'sehk'
+        else:
+            replacement = _LOOKUP[key]
+        pieces.append(sample[last:start])
+        pieces.append(replacement)
+        last = end
+    if pieces:
+        pieces.append(sample[last:])
+        sample = ''.join(pieces)
+
+    sample = _DIGITS_RE.sub(_digits, sample)
+    return _N_RE.sub(_n_unit, sample)
+
+
+def get_words(sample):
+    """Drop tokens with digits, split the rest on non-letters and remove stopwords."""
+    words = []
+    for token in sample.split():
+        if _WORD(token):
+            if token not in STOPWORDS:
+                words.append(token)
+        elif not any(c.isdigit() for c in token):
+            words.extend(w for w in _NON_ALPHA.split(token) if w and w not in STOPWORDS)
+    return words
+
+
+def get_clean0(sample):
+
+    sample = sample.upper().split('\n')
+    n_lines = len(sample)
+    sample = ['' if (('NEWSDESK' in xx) & (n_lines-yy <= 5)) else xx for yy, xx in enumerate(sample)]
+    sample = ' '.join(sample)
+    sample = _PARENS.sub('', sample)
+    sample = _ANGLES.sub('', sample)
+    sample = _EXCHANGES.sub('', sample)
+
+    sample = substitute(sample.lower())
+    return ' '.join(get_words(sample))
+
+
+def split_sentences(sample):
+    """Sentence chunks as cut by the get_clean2/3/4 n-gram functions, before get_clean0."""
+    sample = sample.upper().split('\n')
+    sample = ' '.join(sample)
+    sample = _PARENS.sub('', sample)
+    sample = _ANGLES.sub('', sample)
+    return sample.replace('?', '***').replace('!', '***').replace('.', '***').replace(':', '***').replace(';', '***').split('***')
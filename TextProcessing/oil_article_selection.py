@@ -9,9 +9,16 @@ Return    : 	dataframe of selected articles' information
 
 """  
 import pandas as pd
+import numpy as np
 import os
-from tqdm import tqdm
 import ast
+from multiprocessing import Pool
+from tqdm import tqdm
+
+import ingest_pool
+import article_store
+import subject_index
+import pnac_index
 
 import argparse
 from argparse import RawTextHelpFormatter
@@ -23,6 +30,21 @@ def parse_option():
                         default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/info')
     parser.add_argument('--outputPath', type=str, 
                         default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/oil_info')
+    parser.add_argument('--inputStorePath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/info')
+    parser.add_argument('--tagIndexPath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/subject_index/info')
+    parser.add_argument('--storePath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/oil_info')
+    parser.add_argument('--pnacIndexPath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/pnac_index',
+                        help='PNAC -> first article index over all months (pnac_index.py); empty: dedupe within each month')
+    parser.add_argument('--outputFormat', type=str, choices=['csv', 'parquet', 'both'],
+                        default='both' if article_store.HAVE_PARQUET else 'csv')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--overwrite', type=bool, default=False)
+    parser.add_argument('--months', type=str, default='',
+                        help='comma separated YYYYMM to process (default all), set by pipeline.py')
     opt = parser.parse_args()
     return opt
 
@@ -30,24 +52,127 @@ opt = parse_option()
 print(opt)
 
 
-def main():
-    energyq = pd.read_csv(opt.tagPath, sep=',')
-    energyq = energyq.energytag.tolist()
-    energyq = set(map(lambda x: 'N2:'+x.upper(), energyq))
+energyq = pd.read_csv(opt.tagPath, sep=',')
+energyq = energyq.energytag.tolist()
+energyq = set(map(lambda x: 'N2:'+x.upper(), energyq))
+
+
+def read_month(file, YYYYMM, columns=None):
+    """Articles of the month with any energy tag."""
+    if article_store.has_month(opt.inputStorePath, YYYYMM):
+        Temp = article_store.read_month(opt.inputStorePath, YYYYMM, columns)
+    elif columns is not None:
+        Temp = pd.read_csv(f'{opt.inputPath}/{YYYYMM}_info.csv', sep=',', usecols=columns)[columns]
+    else:
+        Temp = pd.read_csv(file, sep=',')    
+    index = subject_index.load_month(opt.tagIndexPath, YYYYMM)
+    if index is not None and len(index) == len(Temp):
+        # articles with any energy tag from the inverted index
+        Temp['energyq_check'] = index.any(energyq)
+    else:
+        subjects = (ast.literal_eval(i) if isinstance(i, str) else i for i in Temp['subject'])
+        Temp['energyq_check'] = [energyq.intersection(i) != set() for i in subjects]
+    return Temp[Temp['energyq_check']]
+
+
+def chain_file(job):
+    """First energy article of every PNAC chain of the month, saved for the PNAC index."""
+    file, _, YYYYMM = job
+    Temp = read_month(file, YYYYMM, ['Id', 'TimeStamp', 'PNAC', 'subject'])
+    # articles without PNAC are in no chain (dropped by the groupby of the selection)
+    Temp = Temp[Temp['PNAC'].notnull()]
+    pnac_index.save_month(opt.pnacIndexPath, YYYYMM,
+                          pnac_index.chains(Temp['PNAC'], Temp['TimeStamp'], Temp['Id'], YYYYMM))
+    return YYYYMM
+
 
-    for file in tqdm(os.listdir(opt.inputPath)):
-        Temp = pd.read_csv(f'{opt.inputPath}/{file}', sep=',')    
-        Temp['energyq_check'] = [energyq.intersection(ast.literal_eval(i)) != set() for i in Temp['subject']]
-        Temp = Temp[Temp['energyq_check']]
+def select_file(job):
+    file, _, YYYYMM = job
+    Temp = read_month(file, YYYYMM)
 
+    if opt.pnacIndexPath:
+        # keep the first article in chain over all months (before revisions, also across month ends)
+        Temp = Temp[Temp['PNAC'].notnull()]
+        index = pnac_index.PnacIndex(opt.pnacIndexPath, 'r')
+        first = index.is_first(pnac_index.hashes(Temp['PNAC']), pnac_index.hashes(Temp['Id']), YYYYMM)
+        # one article per chain when its first article is repeated in the month file
+        Temp1 = Temp[first].sort_values('TimeStamp', kind='stable').drop_duplicates('PNAC')
+        Temp1 = Temp1.sort_values('PNAC', kind='stable')
+        Temp1 = Temp1[Temp1['augbod'].notnull()]
+    else:
         Temp = Temp.sort_values('TimeStamp').groupby('PNAC')
         # keep the first article in chain (before revisions)
         Temp1 = Temp.first().reset_index()  
         Temp1 = Temp1[Temp1['augbod'].notnull()].reset_index()
 
+    # TimeStamp_raw: the archive string of a TimeStamp read from the store
+    Temp1 = Temp1[['Id', 'TimeStamp', 'headline', 'subject', 'augbod'] + (['TimeStamp_raw'] if 'TimeStamp_raw' in Temp1 else [])]
+
+    if opt.outputFormat != 'csv':
+        article_store.write_month(opt.storePath, YYYYMM, Temp1)
+    if opt.outputFormat != 'parquet':
+        Temp1 = Temp1.assign(TimeStamp=article_store.timestamp_strings(Temp1))
         Temp1 = Temp1[['Id', 'TimeStamp', 'headline', 'subject', 'augbod']]
+        ingest_pool.atomic_csv(Temp1, f'{opt.outputPath}/oil_{YYYYMM}_info.csv', encoding = 'utf-8', index=False)
+    return len(Temp1)
+
+
+def update_index(jobs, todo):
+    """
+        Index the chains of the months to select, of the months never indexed and of the months whose
+        input is newer than their chains.
+        Return : months whose first articles changed, to be selected again
+    """
+    indexed = set(pnac_index.indexed_months(opt.pnacIndexPath))
+    reindex = [job for job in jobs if job in todo or job[2] not in indexed or
+               os.path.getmtime(pnac_index.month_path(opt.pnacIndexPath, job[2])) < os.path.getmtime(job[0])]
+    old = [pnac_index.load_month(opt.pnacIndexPath, job[2]) for job in reindex if job[2] in indexed]
+    with Pool(opt.workers) as pool:
+        new = [pnac_index.load_month(opt.pnacIndexPath, YYYYMM)
+               for YYYYMM in tqdm(pool.imap_unordered(chain_file, reindex), total=len(reindex))]
+    index = pnac_index.PnacIndex(opt.pnacIndexPath)
+
+    if not old:
+        # new months only: add their chains to the table
+        changed = set()
+        for entries in sorted(new, key=lambda e: e['month'][0] if len(e) else 0):
+            changed |= index.merge(entries)
+        index.flush()
+        return changed
+
+    # months indexed again: rebuild the table from the chains of every month
+    keys = np.unique(np.concatenate([e['key'] for e in old + new]))
+    before = index.first(keys)
+    del index
+    after = pnac_index.rebuild(opt.pnacIndexPath, pnac_index.indexed_months(opt.pnacIndexPath)).first(keys)
+    moved = (before['id'] != after['id']) | (before['month'] != after['month'])
+    return {str(m) for m in set(before['month'][moved].tolist()) | set(after['month'][moved].tolist())} - {'-1'}
+
+
+def main():
+    # only completed months: raw_info.py writes *_info.csv and the store partitions atomically
+    jobs = []
+    for YYYYMM, file in article_store.month_files(opt.inputStorePath, opt.inputPath).items():
+        if article_store.has_month(opt.inputStorePath, YYYYMM):
+            file = f'{article_store.partition(opt.inputStorePath, YYYYMM)}/body.parquet'
+        # the store partition is written before the csv
+        if opt.outputFormat == 'parquet':
+            done = f'{article_store.partition(opt.storePath, YYYYMM)}/meta.parquet'
+        else:
+            done = f'{opt.outputPath}/oil_{YYYYMM}_info.csv'
+        jobs.append((file, done, YYYYMM))
+    selected = [job for job in jobs if not opt.months or job[2] in opt.months.split(',')]
+    if not opt.pnacIndexPath:
+        ingest_pool.run(select_file, selected, opt.workers, opt.overwrite)
+        return
 
-        Temp1.to_csv(f'{opt.outputPath}/oil_{file}', encoding = 'utf-8', index=False)
+    # chains are indexed over every month, so a revision in the next month is dropped too
+    todo = ingest_pool.pending(selected, opt.overwrite)
+    changed = update_index(jobs, todo)
+    again = [job for job in jobs if job[2] in changed and job not in todo and os.path.isfile(job[1])]
+    if again:
+        print(f'{len(again)} months selected before have new first articles: {",".join(j[2] for j in again)}')
+    ingest_pool.run(select_file, todo + again, opt.workers, overwrite=True)
 
 
     
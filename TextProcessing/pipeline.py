@@ -0,0 +1,416 @@
+#!/user/kh3191/.conda/envs/nlp/bin/python
+
+"""
+    Function           : Incremental build of the TextProcessing pipeline
+                             raw_info -> oil_article_selection -> tokens -> dtm, ngram, sentcode
+                             ngram -> entropy, dtm -> topic_allocation -> info -> concat
+                             -> date_fixed_measures -> agg_daily
+                         Every stage declares its per-month inputs and outputs. A month is rebuilt
+                         only when the fingerprint of its inputs changed since the last build (content
+                         hash of the input files, the stage script and its modules, the parameter files
+                         such as the word and tag lists, and parameters such as monthWindow or the
+                         stemmer), or when one of its outputs is missing. Entropy months depend on
+                         the n-gram months of their window, so a changed n-gram month only rebuilds
+                         the entropy months whose window holds it.
+                         Stages run as soon as the stages they depend on are done, and the stale
+                         months of a stage are split over several processes (--jobs in total).
+                         Fingerprints are kept in --statePath; file hashes are only recomputed for
+                         files whose size or modification time changed.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+
+import token_cache
+import article_store
+import subject_index
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--dataPath', type=str,
+           default='/data/ThomsonReuters_NewsArchive')
+    parser.add_argument('--rootPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing',
+           help='DataProcessing folder holding every stage output')
+    parser.add_argument('--statePath', type=str, default='',
+           help='fingerprints of the last build (default rootPath/build_state.json)')
+    parser.add_argument('--logPath', type=str, default='',
+           help='one log per stage process (default rootPath/build_logs)')
+    parser.add_argument('--startYear', type=int, default=1996)
+    parser.add_argument('--endYear', type=int, default=2023)
+    parser.add_argument('--stages', type=str, default='',
+           help='comma separated stages to build (default all); the stages they depend on must be up to date')
+    parser.add_argument('--force', type=str, default='',
+           help='comma separated stages to rebuild for every month')
+    parser.add_argument('--jobs', type=int, default=4,
+           help='stage processes running at the same time')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+           help='pool size of raw_info, oil_article_selection and tokens')
+    parser.add_argument('--outputFormat', type=str, choices=['csv', 'both'],
+           default='both' if article_store.HAVE_PARQUET else 'csv',
+           help='info and oil_info files; both also writes the article store')
+    parser.add_argument('--tagPath', type=str, default='energytag.csv')
+    parser.add_argument('--inputWordsPath', type=str, default='clustering_C.csv')
+    parser.add_argument('--sentDicPath', type=str, default='2014.txt')
+    parser.add_argument('--holidayPath', type=str, default='')
+    parser.add_argument('--monthTrials', type=int, default=27)
+    parser.add_argument('--monthWindow', type=int, default=24)
+    parser.add_argument('--n_topics', type=int, default=7)
+    parser.add_argument('--dryRun', type=bool, default=False,
+           help='print the stale months of the stages that can be planned now and exit')
+    parser.add_argument('--adopt', type=bool, default=False,
+           help='record the outputs already on disk as built (first use on an existing tree) and exit')
+    opt = parser.parse_args()
+    return opt
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+class FileHashes(object):
+    """Content hashes of files, cached by (size, mtime) so unchanged files are not read again."""
+
+    def __init__(self, known=None):
+        self.known = known if known is not None else {}
+
+    def __call__(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        entry = self.known.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self.known[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+
+class BuildState(object):
+    """{'files': file hash cache, 'stages': {stage: {YYYYMM or '*': fingerprint}}}, saved atomically."""
+
+    def __init__(self, path):
+        self.path = path
+        state = {'files': {}, 'stages': {}}
+        if os.path.isfile(path):
+            with open(path) as f:
+                state = json.load(f)
+        self.hashes = FileHashes(state['files'])
+        self.stages = state['stages']
+
+    def fingerprint(self, stage, YYYYMM):
+        h = hashlib.sha1(json.dumps(stage.params, sort_keys=True).encode())
+        for path in stage.files + stage.inputs(YYYYMM):
+            h.update(f'{path}:{self.hashes(path)}\n'.encode())
+        return h.hexdigest()
+
+    def record(self, stage, fingerprints):
+        self.stages.setdefault(stage.name, {}).update(fingerprints)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.hashes.known, 'stages': self.stages}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Stage(object):
+    """
+        name     : stage name
+        script   : script run for the stage (from this folder)
+        deps     : stages that must be built first
+        inputs   : YYYYMM -> input files of the month
+        outputs  : YYYYMM -> output files of the month
+        files    : code and parameter files every month depends on (word list, tag list, ...)
+        params   : parameter values every month depends on
+        args     : command line of the script
+        pooled   : the script runs its months on its own process pool (one process, --workers)
+        per_month: False for the stages over the whole history, built as one unit '*'
+    """
+
+    def __init__(self, name, script, deps, inputs, outputs, files=(), params=None, args=(), pooled=False,
+                 per_month=True):
+        self.name = name
+        self.script = script
+        self.deps = deps
+        self.inputs = inputs
+        self.outputs = outputs
+        self.files = [script] + list(files)
+        self.params = params or {}
+        self.args = list(args)
+        self.pooled = pooled
+        self.per_month = per_month
+
+    def stale(self, state, months, force=False):
+        """{YYYYMM: fingerprint} of the months to rebuild."""
+        built = state.stages.get(self.name, {})
+        todo = {}
+        for YYYYMM in (months if self.per_month else ['*']):
+            fingerprint = state.fingerprint(self, YYYYMM)
+            if force or built.get(YYYYMM) != fingerprint or \
+                    not all(os.path.isfile(path) for path in self.outputs(YYYYMM)):
+                todo[YYYYMM] = fingerprint
+        return todo
+
+    def commands(self, months, jobs, workers):
+        """Command lines rebuilding `months`, split into at most `jobs` processes of consecutive months."""
+        cmd = [sys.executable, self.script] + self.args
+        if not self.per_month:
+            return [(months, cmd)]
+        if self.pooled:
+            return [(months, cmd + [f'--months={",".join(months)}', f'--workers={workers}', '--overwrite=True'])]
+        size = -(-len(months) // max(1, min(jobs, len(months))))
+        return [(months[i:i+size], cmd + [f'--months={",".join(months[i:i+size])}'])
+                for i in range(0, len(months), size)]
+
+
+def raw_months(dataPath, startYear, endYear):
+    """YYYYMM -> raw archive file, as listed by raw_info.py."""
+    files = {}
+    for year in range(startYear, endYear+1):
+        folder = f'{dataPath}/{year}'
+        if os.path.isdir(folder):
+            for raw_file in os.listdir(folder):
+                files[raw_file[-15:-9]] = f'{folder}/{raw_file}'
+    return dict(sorted(files.items()))
+
+
+def stages(opt, raw):
+    root = opt.rootPath
+    months = list(raw)
+    info, oil_info = f'{root}/info', f'{root}/oil_info'
+    info_store, oil_store = f'{root}/article_store/info', f'{root}/article_store/oil_info'
+    tag_index, cache = f'{root}/subject_index/info', f'{root}/token_cache'
+    dtm, measure = f'{root}/dtm_Clustering_C', f'{root}/article_measure'
+    combined, concat = f'{root}/combined_info', f'{root}/concat'
+    store = opt.outputFormat != 'csv'
+
+    def month_files(csv, partition):
+        files = [csv]
+        if store:
+            files += [f'{partition}/meta.parquet', f'{partition}/body.parquet']
+        return files
+
+    def info_files(YYYYMM):
+        return month_files(f'{info}/{YYYYMM}_info.csv', article_store.partition(info_store, YYYYMM))
+
+    def oil_files(YYYYMM):
+        return month_files(f'{oil_info}/oil_{YYYYMM}_info.csv', article_store.partition(oil_store, YYYYMM))
+
+    def oil_inputs(YYYYMM):
+        # PNAC chains are deduplicated over all months (pnac_index.py); revisions cross into the next month
+        fnum = months.index(YYYYMM)
+        inputs = []
+        for m in months[max(fnum-1, 0):fnum+2]:
+            inputs += info_files(m) + [subject_index.month_path(tag_index, m)]
+        return inputs
+
+    def cached(config, YYYYMM):
+        return token_cache.month_path(cache, token_cache.CONFIGS[config], YYYYMM)
+
+    def ngram_files(YYYYMM):
+        return [f'{measure}/{n}gram/{YYYYMM}_{n}gram.npz' for n in [3, 4]]
+
+    def entropy_inputs(YYYYMM):
+        # entropy.py positions the window on the sorted month list
+        fnum = months.index(YYYYMM)
+        window = []
+        if fnum >= opt.monthTrials:
+            for m in months[fnum-opt.monthTrials:fnum-opt.monthTrials+opt.monthWindow]:
+                window += ngram_files(m)
+        return [f'{oil_info}/oil_{YYYYMM}_info.csv', cached('entropy', YYYYMM)] + window
+
+    def measure_files(YYYYMM):
+        return [f'{measure}/sentiment/{YYYYMM}_sent.csv', f'{measure}/total/{YYYYMM}_total.csv',
+                f'{measure}/topic_allocation/{YYYYMM}_topic_alloc.csv', f'{measure}/entropy/{YYYYMM}_entropy.csv']
+
+    fmt = f'--outputFormat={opt.outputFormat}'
+    token_stages = ['dtm', 'ngram', 'entropy', 'sentiment']
+    # modules of the tokenization (token_cache.py), for the stages that tokenize months missing from the cache
+    tokenizer = ['token_cache.py', 'normalizer.py', 'stemming.py', 'utils.py']
+    return [
+        Stage('raw_info', 'raw_info.py', [],
+              lambda m: [raw[m]],
+              lambda m: info_files(m) + [subject_index.month_path(tag_index, m)],
+              files=['json_stream.py', 'article_store.py', 'subject_index.py', 'ingest_pool.py'],
+              args=[f'--dataPath={opt.dataPath}', f'--outputPath={info}', f'--storePath={info_store}',
+                    f'--tagIndexPath={tag_index}', fmt, f'--startYear={opt.startYear}', f'--endYear={opt.endYear}'],
+              pooled=True),
+        Stage('oil_article_selection', 'oil_article_selection.py', ['raw_info'],
+              oil_inputs,
+              oil_files,
+              files=[opt.tagPath, 'article_store.py', 'pnac_index.py', 'subject_index.py', 'ingest_pool.py'],
+              args=[f'--tagPath={opt.tagPath}', f'--inputPath={info}', f'--inputStorePath={info_store}',
+                    f'--tagIndexPath={tag_index}', f'--outputPath={oil_info}', f'--storePath={oil_store}',
+                    f'--pnacIndexPath={root}/pnac_index', fmt],
+              pooled=True),
+        Stage('tokens', 'tokens.py', ['oil_article_selection'],
+              oil_files,
+              lambda m: sorted({cached(s, m) for s in token_stages}),
+              files=tokenizer + ['article_store.py'],
+              params=dict({s: token_cache.CONFIGS[s] for s in token_stages}, version=token_cache.CACHE_VERSION),
+              args=[f'--inputPath={oil_info}', f'--storePath={oil_store}', f'--cachePath={cache}',
+                    f'--stages={",".join(token_stages)}'],
+              pooled=True),
+        Stage('dtm', 'dtm.py', ['tokens'],
+              lambda m: [cached('dtm', m)],
+              lambda m: [f'{dtm}/{m}_dtm.npz', f'{dtm}/{m}_dtm.csv', f'{root}/dtm_numeric/{m}_coo.npz'],
+              files=[opt.inputWordsPath, 'ngram_count.py', 'sparse_dtm.py', 'article_registry.py'] + tokenizer,
+              args=[f'--inputWordsPath={opt.inputWordsPath}', f'--inputPath={oil_info}', f'--outputPath={dtm}',
+                    '--outputFormat=both', f'--tokenCachePath={cache}', f'--cooPath={root}/dtm_numeric',
+                    f'--registryPath={root}/article_registry.txt']),
+        Stage('ngram', 'ngram.py', ['tokens'],
+              lambda m: [cached('ngram', m)],
+              ngram_files,
+              files=['ngram_count.py'] + tokenizer,
+              args=[f'--inputPath={oil_info}', f'--outputPath={measure}', f'--tokenCachePath={cache}']),
+        Stage('entropy', 'entropy.py', ['tokens', 'ngram'],
+              entropy_inputs,
+              lambda m: [f'{measure}/entropy/{m}_entropy.csv'],
+              files=['entropy_kernel.py', 'ngram_store.py', 'ngram_count.py'] + tokenizer,
+              params={'monthTrials': opt.monthTrials, 'monthWindow': opt.monthWindow},
+              args=[f'--ngPath={measure}', f'--inputPath={oil_info}', f'--monthTrials={opt.monthTrials}',
+                    f'--monthWindow={opt.monthWindow}', f'--tokenCachePath={cache}']),
+        Stage('sentcode', 'sentcode.py', ['tokens'],
+              lambda m: [cached('sentiment', m)],
+              lambda m: [f'{measure}/sentiment/{m}_sent.csv', f'{measure}/total/{m}_total.csv'],
+              files=[opt.sentDicPath, 'lexicon.py'] + tokenizer,
+              args=[f'--sentDicPath={opt.sentDicPath}', f'--inputPath={oil_info}',
+                    f'--outputPathSent={measure}/sentiment', f'--outputPathTotal={measure}/total',
+                    f'--tokenCachePath={cache}']),
+        Stage('topic_allocation', 'topic_allocation.py', ['dtm'],
+              lambda m: [f'{dtm}/{m}_dtm.npz'] + oil_files(m),
+              lambda m: [f'{measure}/topic_allocation/{m}_topic_alloc.csv'],
+              files=[opt.inputWordsPath, 'topics.py', 'sparse_dtm.py', 'ngram_count.py', 'article_store.py'],
+              params={'n_topics': opt.n_topics},
+              args=[f'--inputWordsPath={opt.inputWordsPath}', f'--inputPath_info={oil_info}',
+                    f'--storePath_info={oil_store}', f'--inputPath_dtm={dtm}',
+                    f'--outputPath={measure}/topic_allocation', f'--n_topics={opt.n_topics}']),
+        Stage('info', 'info.py', ['sentcode', 'topic_allocation', 'entropy'],
+              lambda m: oil_files(m) + measure_files(m),
+              lambda m: [f'{combined}/{m}_info.csv'],
+              files=['session_calendar.py', 'article_store.py'],
+              args=[f'--inputPath={oil_info}', f'--storePath={oil_store}', f'--measurePath={measure}',
+                    f'--outputPath={combined}']),
+        Stage('concat', 'concat.py', ['info'],
+              lambda m: [f'{combined}/{m}_info.csv' for m in months] + [f'{dtm}/{m}_dtm.npz' for m in months],
+              lambda m: [f'{concat}/info_concatenate.csv', f'{concat}/dtm_concatenate.npz', f'{concat}/dtm_corpus/months.csv'],
+              files=['sparse_corpus.py', 'sparse_dtm.py', 'gram_matrix.py', 'article_registry.py', 'ngram_count.py'],
+              args=[f'--inputPath_info={combined}', f'--inputPath_dtm={dtm}', f'--outputPath={concat}',
+                    f'--registryPath={root}/article_registry.txt'],
+              per_month=False),
+        Stage('date_fixed_measures', 'date_fixed_measures.py', ['concat'],
+              lambda m: [f'{concat}/info_concatenate.csv'],
+              lambda m: [f'{concat}/date_fixed_article_level_measures.csv'],
+              files=['session_calendar.py'] + ([opt.holidayPath] if opt.holidayPath else []),
+              args=[f'--inputPath={concat}/info_concatenate.csv',
+                    f'--outputPath={concat}/date_fixed_article_level_measures.csv',
+                    f'--holidayPath={opt.holidayPath}'],
+              per_month=False),
+        Stage('agg_daily', 'agg_daily.py', ['date_fixed_measures'],
+              lambda m: [f'{concat}/date_fixed_article_level_measures.csv'],
+              lambda m: ['NYtime_daily_level_measures_C_2023.csv', 'NYtime_daily_level_sums_C_2023.csv'],
+              files=['aggregation.py'],
+              args=[f'--wkdir={concat}'],
+              per_month=False),
+    ]
+
+
+def build(opt):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    raw = raw_months(opt.dataPath, opt.startYear, opt.endYear)
+    months = list(raw)
+    state = BuildState(opt.statePath or f'{opt.rootPath}/build_state.json')
+    logPath = opt.logPath or f'{opt.rootPath}/build_logs'
+    os.makedirs(logPath, exist_ok=True)
+
+    graph = stages(opt, raw)
+    selected = set(opt.stages.split(',')) if opt.stages else {stage.name for stage in graph}
+    force = set(opt.force.split(',')) if opt.force else set()
+    done = {stage.name for stage in graph if stage.name not in selected}
+    waiting = [stage for stage in graph if stage.name in selected]
+    # Popen -> (stage name, fingerprints of its months, log file)
+    running = {}
+    remaining = {}
+    failed = []
+    start = time.time()
+
+    def plan():
+        """Plan the stages whose dependencies are built (their inputs are final now), until none is left."""
+        ready = [s for s in waiting if all(d in done for d in s.deps)]
+        while ready:
+            for stage in ready:
+                waiting.remove(stage)
+                todo = stage.stale(state, months, stage.name in force)
+                print(f'{stage.name}: {len(todo)} of {len(months) if stage.per_month else 1} to build', flush=True)
+                if opt.adopt:
+                    # record what is on disk as built
+                    state.record(stage, {m: f for m, f in todo.items()
+                                         if all(os.path.isfile(path) for path in stage.outputs(m))})
+                    done.add(stage.name)
+                elif opt.dryRun:
+                    if todo and stage.per_month:
+                        print('    ' + ','.join(todo))
+                    if not todo:
+                        done.add(stage.name)
+                elif not todo:
+                    done.add(stage.name)
+                else:
+                    for path in {os.path.dirname(p) for m in todo for p in stage.outputs(m)} - {''}:
+                        os.makedirs(path, exist_ok=True)
+                    remaining[stage.name] = [(chunk, cmd, {m: todo[m] for m in chunk})
+                                             for chunk, cmd in stage.commands(list(todo), opt.jobs, opt.workers)]
+            ready = [s for s in waiting if all(d in done for d in s.deps)]
+
+    while True:
+        plan()
+        if opt.dryRun or opt.adopt:
+            for stage in waiting:
+                print(f'{stage.name}: waits on {", ".join(d for d in stage.deps if d not in done)}')
+            break
+
+        # start processes, at most opt.jobs at a time
+        for name, chunks in remaining.items():
+            while chunks and len(running) < opt.jobs and not failed:
+                chunk, cmd, fingerprints = chunks.pop(0)
+                log = f'{logPath}/{name}.log' if chunk == ['*'] else f'{logPath}/{name}_{chunk[0]}-{chunk[-1]}.log'
+                log = open(log, 'w')
+                running[subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)] = (name, fingerprints, log)
+        if not running:
+            break
+        time.sleep(1)
+
+        for proc in [p for p in running if p.poll() is not None]:
+            name, fingerprints, log = running.pop(proc)
+            log.close()
+            if proc.returncode != 0:
+                failed.append(f'{name} ({log.name})')
+                continue
+            state.record(next(s for s in graph if s.name == name), fingerprints)
+            if not remaining[name] and not any(n == name for n, _, _ in running.values()):
+                del remaining[name]
+                done.add(name)
+                print(f'{name}: done ({time.time() - start:.0f}s)', flush=True)
+
+    state.save()
+    if failed or waiting and not (opt.dryRun or opt.adopt):
+        sys.exit('failed: ' + ', '.join(failed + [f'{s.name} (not built)' for s in waiting]))
+
+
+if __name__ == '__main__':
+    opt = parse_option()
+    print(opt)
+    build(opt)
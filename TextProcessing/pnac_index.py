@@ -0,0 +1,200 @@
+"""
+    Function           : Persistent PNAC -> first article index used to drop story revisions across
+                         months (oil_article_selection.py, live.py).
+                         The index is an open-addressing hash table stored as one memory-mapped
+                         .npy file ({indexPath}/table.npy); each slot holds
+                             key   : 64-bit hash of the PNAC (0 marks an empty slot)
+                             ts    : TimeStamp of the first article of the chain (ns since epoch)
+                             id    : 64-bit hash of the Id of that article
+                             month : YYYYMM of the month file holding it
+                         Lookups and inserts probe linearly from key & (capacity - 1) for a whole
+                         batch of keys at once, and the table is kept at most half full.
+                         Every month's chains are also kept ({indexPath}/months/{YYYYMM}_chains.npy),
+                         so the table can be rebuilt when a month is processed again.
+"""
+
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+DTYPE = np.dtype([('key', '<u8'), ('ts', '<i8'), ('id', '<u8'), ('month', '<i4')])
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def hashes(strings):
+    """64-bit hash of every string (never 0, which marks an empty slot)."""
+    out = np.fromiter((int.from_bytes(hashlib.blake2b(str(s).encode(), digest_size=8).digest(), 'little')
+                       for s in strings), dtype=np.uint64, count=len(strings))
+    out[out == 0] = 1
+    return out
+
+
+def timestamps(TimeStamp):
+    """Archive timestamps (strings or datetime64) -> int64 ns since epoch."""
+    ts = pd.to_datetime(pd.Series(TimeStamp), utc=True, format='ISO8601')
+    return ts.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def chains(PNAC, TimeStamp, Id, YYYYMM):
+    """First article (earliest TimeStamp) of every chain among the given articles; YYYYMM per month file or per article."""
+    entries = np.empty(len(PNAC), dtype=DTYPE)
+    entries['key'] = hashes(PNAC)
+    entries['ts'] = timestamps(TimeStamp)
+    entries['id'] = hashes(Id)
+    entries['month'] = np.asarray(YYYYMM).astype(np.int64)
+    return first_of_chains(entries)
+
+
+def first_of_chains(entries):
+    """Earliest entry of every key; ties go to the earlier month, then to the earlier entry."""
+    order = np.lexsort((entries['month'], entries['ts'], entries['key']))
+    entries = entries[order]
+    first = np.ones(len(entries), dtype=bool)
+    first[1:] = entries['key'][1:] != entries['key'][:-1]
+    return entries[first]
+
+
+def month_path(indexPath, YYYYMM):
+    return f'{indexPath}/months/{YYYYMM}_chains.npy'
+
+
+def save_month(indexPath, YYYYMM, entries):
+    path = month_path(indexPath, YYYYMM)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path[:-len('.npy')] + '.tmp.npy'
+    np.save(tmp_path, entries)
+    os.replace(tmp_path, path)
+
+
+def load_month(indexPath, YYYYMM):
+    path = month_path(indexPath, YYYYMM)
+    return np.load(path) if os.path.isfile(path) else np.empty(0, dtype=DTYPE)
+
+
+def indexed_months(indexPath):
+    return sorted(os.path.basename(f)[:6] for f in glob.glob(f'{indexPath}/months/*_chains.npy'))
+
+
+def capacity_for(n):
+    """Smallest power of two keeping n entries at most half of the table."""
+    capacity = 1024
+    while n > capacity // 2:
+        capacity *= 2
+    return capacity
+
+
+def insert(table, entries):
+    """Insert entries with distinct keys that are not in the table yet (linear probing)."""
+    mask = len(table) - 1
+    pos = (entries['key'] & np.uint64(mask)).astype(np.int64)
+    while len(entries):
+        empty = np.nonzero(table['key'][pos] == 0)[0]
+        # one entry per empty slot, the others probe further
+        _, claim = np.unique(pos[empty], return_index=True)
+        won = empty[claim]
+        table[pos[won]] = entries[won]
+        lost = np.ones(len(entries), dtype=bool)
+        lost[won] = False
+        entries, pos = entries[lost], (pos[lost] + 1) & mask
+
+
+def write_table(path, table):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path[:-len('.npy')] + '.tmp.npy'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=DTYPE, shape=table.shape)
+    out[:] = table
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+def table_of(entries):
+    table = np.zeros(capacity_for(len(entries)), dtype=DTYPE)
+    insert(table, entries)
+    return table
+
+
+class PnacIndex(object):
+
+    def __init__(self, indexPath, mode='r+'):
+        """mode 'r' for readers (selection workers), 'r+' for the process updating the index."""
+        self.path = f'{indexPath}/table.npy'
+        self.mode = mode
+        if not os.path.isfile(self.path):
+            write_table(self.path, table_of(np.empty(0, dtype=DTYPE)))
+        self._open()
+
+    def _open(self):
+        self.table = np.load(self.path, mmap_mode=self.mode)
+        self.mask = np.uint64(len(self.table) - 1)
+        self.count = int(np.count_nonzero(self.table['key']))
+
+    def __len__(self):
+        return self.count
+
+    def find(self, keys):
+        """Slot of every key, -1 where the key is not in the table."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        slot = np.full(len(keys), -1, dtype=np.int64)
+        pos = (keys & self.mask).astype(np.int64)
+        active = np.arange(len(keys))
+        while len(active):
+            k = self.table['key'][pos[active]]
+            hit = k == keys[active]
+            slot[active[hit]] = pos[active[hit]]
+            active = active[~hit & (k != 0)]
+            pos[active] = (pos[active] + 1) & int(self.mask)
+        return slot
+
+    def first(self, keys):
+        """Entry of every key (key 0 and month -1 where the chain is unknown)."""
+        slot = self.find(keys)
+        out = np.zeros(len(slot), dtype=DTYPE)
+        out['month'] = -1
+        out[slot >= 0] = self.table[slot[slot >= 0]]
+        return out
+
+    def is_first(self, keys, ids, YYYYMM):
+        """True for the articles (PNAC hash, Id hash) that are the first of their chain, in month YYYYMM."""
+        first = self.first(keys)
+        return (first['id'] == ids) & (first['month'] == int(YYYYMM))
+
+    def merge(self, entries):
+        """
+            Add chain entries (first_of_chains output); known chains keep the earlier article.
+            Return : months whose first articles changed (old and new month of every changed chain)
+        """
+        slot = self.find(entries['key'])
+        known = slot >= 0
+        old = self.table[slot[known]]
+        new = entries[known]
+        earlier = (new['ts'] < old['ts']) | ((new['ts'] == old['ts']) & (new['month'] < old['month']))
+        self.table[slot[known][earlier]] = new[earlier]
+        added = entries[~known]
+        if self.count + len(added) > len(self.table) // 2:
+            # grow: rewrite the table twice as large (or more)
+            write_table(self.path, table_of(np.concatenate([np.array(self.table[self.table['key'] != 0]), added])))
+            self._open()
+        else:
+            insert(self.table, added)
+            self.count += len(added)
+        changed = set(old['month'][earlier].tolist()) | set(new['month'][earlier].tolist())
+        return {str(m) for m in changed}
+
+    def flush(self):
+        if isinstance(self.table, np.memmap):
+            self.table.flush()
+
+
+def rebuild(indexPath, months, chainsPath=None):
+    """Table of the month chains (of chainsPath, default indexPath), replacing the current one; return the new index."""
+    entries = [load_month(chainsPath or indexPath, YYYYMM) for YYYYMM in months]
+    entries = first_of_chains(np.concatenate(entries)) if entries else np.empty(0, dtype=DTYPE)
+    write_table(f'{indexPath}/table.npy', table_of(entries))
+    return PnacIndex(indexPath)
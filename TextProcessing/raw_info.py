@@ -6,9 +6,14 @@ Return    : data frame of article information (raw info)
 """  
 import pandas as pd
 import json
+import re
 import unicodedata
 import os
-from tqdm import tqdm
+
+from json_stream import iter_items
+import ingest_pool
+import article_store
+import subject_index
 
 import argparse
 from argparse import RawTextHelpFormatter
@@ -16,10 +21,24 @@ def parse_option():
     parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
     parser.add_argument('--outputPath', type=str, 
                         default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/info')
+    parser.add_argument('--storePath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/info')
+    parser.add_argument('--tagIndexPath', type=str, 
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/subject_index/info')
+    parser.add_argument('--outputFormat', type=str, choices=['csv', 'parquet', 'both'],
+                        default='both' if article_store.HAVE_PARQUET else 'csv',
+                        help='parquet writes the article store (needs pyarrow), csv the *_info.csv files')
     parser.add_argument('--dataPath', type=str, 
                         default='/data/ThomsonReuters_NewsArchive')
     parser.add_argument('--startYear', type=int, default=1996)
     parser.add_argument('--endYear', type=int, default=2023)
+    parser.add_argument('--streaming', action=argparse.BooleanOptionalAction, default=True,
+                        help='--no-streaming loads the whole file as before')
+    parser.add_argument('--chunkSize', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--overwrite', type=bool, default=False)
+    parser.add_argument('--months', type=str, default='',
+                        help='comma separated YYYYMM to process (default all), set by pipeline.py')
     opt = parser.parse_args()
     return opt
 
@@ -109,14 +128,111 @@ def gen_info(raw_file):
     Temp1 = Temp1.drop(['urgency','lan','body'],axis=1) 
     return Temp1
      
-    
+
+_LANGUAGE = re.compile(r'"language"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+_URGENCY = re.compile(r'"urgency"\s*:\s*"?(-?\d+)"?\s*[,}]')
+
+
+def skip_raw(item):
+    """
+        True if the raw JSON text of an item surely fails the language/urgency filter of gen_info,
+        so it is dropped without being decoded. Undecided items are decoded and filtered as before.
+    """
+    languages = _LANGUAGE.findall(item)
+    if languages and all(l != 'en' and '\\' not in l for l in languages):
+        return True
+    urgencies = _URGENCY.findall(item)
+    return bool(urgencies) and all(int(u) < 2 for u in urgencies)
+
+
+def stream_info(raw_file, output=None, chunkSize=10000, store=None, index_path=None):
+    """
+        Function  : streaming version of gen_info. Items are read one at a time, filtered on the raw
+                    text before decoding and written every chunkSize rows, so memory does not grow
+                    with the size of the raw file. Writes the same csv as gen_info to `output`
+                    (through a temporary file replacing it once the month is complete) and/or the
+                    same rows to `store` (article_store.MonthWriter). The subject index of the
+                    written rows is saved to `index_path` (subject_index.py) before the outputs.
+        Return    : number of articles written
+    """
+    tmp = ingest_pool.tmp_path(output) if output else None
+    columns = ['index', 'Id', 'TimeStamp', 'PNAC', 'headline', 'subject', 'augbod']
+
+    def flush(rows, header):
+        df = pd.DataFrame(rows, columns=columns)
+        if tmp:
+            df.to_csv(tmp, mode='w' if header else 'a', header=header, encoding='utf-8', index=False)
+        if store:
+            store.write(df.drop(['index'], axis=1))
+
+    tags = subject_index.IndexBuilder()
+    # position among the English, urgent articles (the index column written by gen_info)
+    kept = 0
+    written = 0
+    rows = []
+    header = True
+    for item in iter_items(raw_file):
+        if skip_raw(item):
+            continue
+        l = get_info_article(json.loads(item))
+        if (l[5] != 'en')|(int(l[4])<2):
+            continue
+        if l[8] is not None:
+            rows.append((kept,) + l[:4] + (l[6], l[8]))
+            tags.add(l[6])
+        kept += 1
+        if len(rows) >= chunkSize:
+            flush(rows, header)
+            written += len(rows)
+            rows = []
+            header = False
+    if rows or header:
+        flush(rows, header)
+        written += len(rows)
+    if index_path:
+        tags.build().save(index_path)
+    if tmp:
+        os.replace(tmp, output)
+    if store:
+        store.close()
+    return written
+
+
+def info_file(job):
+    raw_file, _, YYYYMM = job
+    output = f'{opt.outputPath}/{YYYYMM}_info.csv' if opt.outputFormat != 'parquet' else None
+    store = None
+    if opt.outputFormat != 'csv':
+        store = article_store.MonthWriter(opt.storePath, YYYYMM,
+                                          ['Id', 'TimeStamp', 'PNAC', 'headline', 'subject', 'augbod'])
+    index_path = subject_index.month_path(opt.tagIndexPath, YYYYMM) if opt.tagIndexPath else None
+    if opt.streaming:
+        return stream_info(raw_file, output, opt.chunkSize, store, index_path)
+    Temp = gen_info(raw_file)
+    if index_path:
+        subject_index.SubjectIndex.from_subjects(Temp['subject']).save(index_path)
+    if output:
+        ingest_pool.atomic_csv(Temp, output, encoding = 'utf-8', index=False)
+    if store:
+        store.write(Temp.drop(['index'], axis=1))
+        store.close()
+    return len(Temp)
+
+
 def main():
+    jobs = []
     for year in range(opt.startYear,opt.endYear+1):
-        for raw_file in tqdm(os.listdir(f'{opt.dataPath}/{year}')):
-        
+        for raw_file in os.listdir(f'{opt.dataPath}/{year}'):
             YYYYMM = raw_file[-15:-9]
-            Temp = gen_info(f'{opt.dataPath}/{year}/{raw_file}')
-            Temp.to_csv(f'{opt.outputPath}/{YYYYMM}_info.csv', encoding = 'utf-8', index=False)
+            if opt.months and YYYYMM not in opt.months.split(','):
+                continue
+            # the store partition is completed last, so it marks a finished month
+            if opt.outputFormat == 'csv':
+                done = f'{opt.outputPath}/{YYYYMM}_info.csv'
+            else:
+                done = f'{article_store.partition(opt.storePath, YYYYMM)}/meta.parquet'
+            jobs.append((f'{opt.dataPath}/{year}/{raw_file}', done, YYYYMM))
+    ingest_pool.run(info_file, jobs, opt.workers, opt.overwrite)
     
     
 if __name__ == '__main__':
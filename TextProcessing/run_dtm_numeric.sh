@@ -1,13 +1,12 @@
 #!/bin/bash
 
+# dtm.py writes the dtm_numeric triplets itself; this converts the dtm files of months written before
+# (one pass over the sparse monthly dtm files, numbered with the global article registry)
+
 DATA1='/work/hw2676/Energy/dtm_Clustering_C'
 FS='/user/hw2676/code/Energy/article_measure/dtm'
 
 
  
 
-cd $DATA1
-for f in *.csv
-do
-	sge_run --grid_mem=32G --grid_ncpus=1 --grid_submit=batch --grid_quiet "${FS}/dtm_numeric.py ${f}"
-done	
+sge_run --grid_mem=32G --grid_ncpus=1 --grid_submit=batch --grid_quiet "${FS}/dtm_numeric.py --dtmPath=${DATA1}"
@@ -0,0 +1,67 @@
+"""
+    Function           : Vectorized timestamps and oil-session dates for info.py and date_fixed_measures.py.
+                         Timestamps are parsed once into datetime64 and handled as arrays:
+                             to_ny    : archive UTC timestamps -> America/New_York (DST aware)
+                             oil_date : New York timestamps -> date of the 14:30 ET oil close the
+                                        article is assigned to ('%Y%m%d'), or 'weekend'
+                         With an exchange holiday calendar, dates falling on a holiday roll forward
+                         to the next trading day.
+"""
+
+import numpy as np
+import pandas as pd
+
+NY = 'America/New_York'
+# seconds after midnight of the 14:30 ET settlement
+CLOSE = 14 * 3600 + 30 * 60
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def parse(timestamps):
+    """'YYYY-MM-DDTHH:MM:SS...' strings -> naive datetime64[s] (the first 19 characters)."""
+    timestamps = pd.Series(timestamps).astype(str)
+    return pd.to_datetime(timestamps.str[:19], format='%Y-%m-%dT%H:%M:%S').values.astype('datetime64[s]')
+
+
+def to_ny(timestamps):
+    """UTC archive timestamps -> New York time in the same layout (fractional seconds and 'Z' kept as is)."""
+    timestamps = pd.Series(timestamps).astype(str)
+    utc = pd.DatetimeIndex(parse(timestamps)).tz_localize('UTC')
+    local = utc.tz_convert(NY).tz_localize(None).values.astype('datetime64[s]')
+    return pd.Series(np.datetime_as_string(local), index=timestamps.index) + timestamps.str[19:].values
+
+
+def read_holidays(path):
+    """Exchange holidays from a csv with a date column (YYYY-MM-DD or YYYYMMDD)."""
+    dates = pd.read_csv(path, dtype={'date': str})['date'].str.replace('-', '', regex=False)
+    return pd.to_datetime(dates, format='%Y%m%d').values.astype('datetime64[D]')
+
+
+def oil_date(timestamps_ny, holidays=None):
+    """
+        Date of the oil close an article belongs to:
+            after 14:30 ET                       -> next day (Friday -> Monday)
+            Saturday, Sunday before 14:30 ET     -> 'weekend'
+            otherwise                            -> same day
+        holidays : optional datetime64[D] exchange holidays; assigned dates falling on one roll
+                   forward to the next trading day
+    """
+    t = parse(timestamps_ny)
+    day = t.astype('datetime64[D]')
+    seconds = (t - day).astype(np.int64)
+    # 1970-01-01 was a Thursday: Monday = 0
+    weekday = (day.astype(np.int64) + 3) % 7
+    after = seconds > CLOSE
+
+    date = day + after.astype(np.int64) + 2 * (after & (weekday == 4))
+    weekend = (weekday == 5) | ((weekday == 6) & (seconds < CLOSE))
+    if holidays is not None:
+        date[~weekend] = np.busday_offset(date[~weekend], 0, roll='forward', holidays=holidays)
+
+    result = np.char.replace(np.datetime_as_string(date), '-', '').astype(object)
+    result[weekend] = 'weekend'
+    return pd.Series(result, index=getattr(timestamps_ny, 'index', None))
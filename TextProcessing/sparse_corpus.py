@@ -0,0 +1,136 @@
+"""
+    Function           : Append-only sparse corpus of the monthly dtm files (concat.py).
+                         The CSR arrays of all months are kept in flat binary files read with
+                         memory maps
+                             data.bin     int32  counts
+                             indices.bin  int32  word of every count
+                             indptr.bin   int64  start of every row in data/indices (one entry per row)
+                             articles.bin int64  global article index of every row (article_registry.py)
+                         and months.csv maps every month to its row range and nnz range (with the
+                         stamp of the dtm file it was read from). Appending a month writes its arrays at
+                         the end of the files and then replaces months.csv, which is the commit point:
+                         rows past the last month of months.csv (an interrupted append) are cut off on
+                         the next open. A month appended again points to its new rows; the old ones
+                         stay in the files until compact().
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ARRAYS = {'data': np.int32, 'indices': np.int32, 'indptr': np.int64, 'articles': np.int64}
+COLUMNS = ['YYYYMM', 'row_start', 'row_end', 'nnz_start', 'nnz_end', 'stamp']
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+class SparseCorpus(object):
+
+    def __init__(self, path, words=None):
+        """words : word list of the columns, required when the corpus is created"""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.isfile(f'{path}/words.txt'):
+            with open(f'{path}/words.txt') as f:
+                self.words = f.read().split('\n')[:-1]
+        else:
+            if words is None:
+                raise ValueError(f'{path} is not a sparse corpus, pass the word list to create it')
+            self.words = list(words)
+            with open(f'{path}/words.txt', 'w') as f:
+                f.writelines(f'{w}\n' for w in self.words)
+        self.months = pd.read_csv(f'{path}/months.csv', dtype={'YYYYMM': str, 'stamp': str}, keep_default_na=False) \
+            if os.path.isfile(f'{path}/months.csv') else pd.DataFrame(columns=COLUMNS)
+        self.months = self.months.set_index('YYYYMM')
+        self.rows, self.nnz = self._used()
+        # drop the rows of an interrupted append
+        for name, dtype in ARRAYS.items():
+            n = self.nnz if name in ['data', 'indices'] else self.rows
+            with open(self.file(name), 'ab') as f:
+                f.truncate(n * np.dtype(dtype).itemsize)
+
+    def file(self, name):
+        return f'{self.path}/{name}.bin'
+
+    def _used(self):
+        """Rows and nnz up to the end of the last committed append (months are always appended at the end)."""
+        if len(self.months) == 0:
+            return 0, 0
+        return int(self.months['row_end'].max()), int(self.months['nnz_end'].max())
+
+    def _commit(self):
+        tmp_path = f'{self.path}/months.tmp.csv'
+        self.months.reset_index()[COLUMNS].to_csv(tmp_path, index=False)
+        os.replace(tmp_path, f'{self.path}/months.csv')
+
+    def array(self, name):
+        n = self.nnz if name in ['data', 'indices'] else self.rows
+        if n == 0:
+            return np.zeros(0, dtype=ARRAYS[name])
+        return np.memmap(self.file(name), dtype=ARRAYS[name], mode='r', shape=(n,))
+
+    def stamp(self, YYYYMM):
+        return self.months.at[YYYYMM, 'stamp'] if YYYYMM in self.months.index else None
+
+    def append(self, YYYYMM, matrix, articles, stamp=''):
+        """Write the month's rows (articles x words) at the end of the corpus, replacing an earlier version."""
+        matrix = sparse.csr_matrix(matrix)
+        matrix.sort_indices()
+        if matrix.shape[1] != len(self.words):
+            raise ValueError(f'{YYYYMM}: {matrix.shape[1]} columns for {len(self.words)} words')
+        arrays = {'data': matrix.data, 'indices': matrix.indices,
+                  'indptr': matrix.indptr[:-1].astype(np.int64) + self.nnz, 'articles': np.asarray(articles)}
+        for name, dtype in ARRAYS.items():
+            with open(self.file(name), 'ab') as f:
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.months.loc[YYYYMM] = [self.rows, self.rows + matrix.shape[0], self.nnz, self.nnz + matrix.nnz, stamp]
+        self.rows += matrix.shape[0]
+        self.nnz += matrix.nnz
+        self.months = self.months.sort_index()
+        self._commit()
+
+    def remove(self, YYYYMM):
+        """Drop a month from the index (its rows stay in the files until compact())."""
+        self.months = self.months.drop(YYYYMM)
+        self._commit()
+
+    def garbage(self):
+        """Rows no month points to (replaced or removed months)."""
+        return self.rows - int((self.months['row_end'] - self.months['row_start']).sum())
+
+    def month(self, YYYYMM):
+        """(CSR matrix, global article index) of a month; data and indices are views of the memory maps."""
+        row_start, row_end, nnz_start, nnz_end = map(int, self.months.loc[YYYYMM, COLUMNS[1:5]])
+        indptr = np.append(self.array('indptr')[row_start:row_end], nnz_end) - nnz_start
+        matrix = sparse.csr_matrix((self.array('data')[nnz_start:nnz_end], self.array('indices')[nnz_start:nnz_end],
+                                    indptr), shape=(row_end - row_start, len(self.words)), copy=False)
+        return matrix, self.array('articles')[row_start:row_end]
+
+    def span(self, start='', end=''):
+        """(CSR matrix, global article index) of the months from start to end (YYYYMM, inclusive), in month order."""
+        months = [m for m in self.months.index if (not start or m >= start) and (not end or m <= end)]
+        if not months:
+            return sparse.csr_matrix((0, len(self.words)), dtype=np.int32), np.zeros(0, dtype=np.int64)
+        parts = [self.month(m) for m in months]
+        return sparse.vstack([p[0] for p in parts], format='csr'), np.concatenate([p[1] for p in parts])
+
+    def compact(self):
+        """Rewrite the corpus with the rows of the current months only, in month order."""
+        tmp_path, old_path = f'{self.path}.compact', f'{self.path}.old'
+        for path in [tmp_path, old_path]:
+            shutil.rmtree(path, ignore_errors=True)
+        tmp = SparseCorpus(tmp_path, self.words)
+        for YYYYMM in self.months.index:
+            matrix, articles = self.month(YYYYMM)
+            tmp.append(YYYYMM, matrix, articles, self.stamp(YYYYMM))
+        os.rename(self.path, old_path)
+        os.rename(tmp_path, self.path)
+        shutil.rmtree(old_path)
+        self.months, self.rows, self.nnz = tmp.months, tmp.rows, tmp.nnz
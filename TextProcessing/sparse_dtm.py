@@ -0,0 +1,146 @@
+"""
+    Function           : Sparse document-term matrices. The word list (e.g. clustering_C.csv) is
+                         mapped to column ids with a dict and each month is kept as a CSR matrix
+                         (articles x words) with Id/TimeStamp side arrays, saved as one .npz.
+                         The same counts are also written as COO triplets keyed by the global
+                         article index (article_registry.py) for cosine.py and concat.py.
+"""
+
+import os
+import csv
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import ngram_count
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def vocab_index(words):
+    """Column id of every word in the list."""
+    return {word: i for i, word in enumerate(words)}
+
+
+def splits(word, n):
+    """Every way of reading `word` as n '.'-joined tokens."""
+    parts = word.split('.')
+    for cuts in combinations(range(1, len(parts)), n - 1):
+        bounds = (0,) + cuts + (len(parts),)
+        yield tuple('.'.join(parts[bounds[i]:bounds[i+1]]) for i in range(n))
+
+
+def gram_columns(index, vocab, grams):
+    """
+        index  : word -> column id
+        vocab  : token strings of the month (token id -> string)
+        grams  : order -> distinct n-grams as token id rows (ngram_count.extract)
+        Return : order -> column id of every distinct n-gram, -1 if it is not in the word list
+    """
+    token_id = {t: i for i, t in enumerate(vocab.tolist())}
+    columns = {}
+    for n, rows in grams.items():
+        word_rows, word_cols = [], []
+        for word, col in index.items():
+            for tokens in splits(word, n):
+                if all(t in token_id for t in tokens):
+                    word_rows.append([token_id[t] for t in tokens])
+                    word_cols.append(col)
+        columns[n] = np.full(len(rows), -1, dtype=np.int64)
+        if word_rows:
+            # exact row matching through a common id space of month grams and word grams
+            both = np.concatenate([rows.reshape(-1, n), np.asarray(word_rows, dtype=rows.dtype)])
+            ids = ngram_count.row_codes((both[:, j] for j in range(n)), len(vocab))
+            col_of_id = np.full(ids.max() + 1, -1, dtype=np.int64)
+            col_of_id[ids[len(rows):]] = word_cols
+            columns[n] = col_of_id[ids[:len(rows)]]
+    return columns
+
+
+def from_batches(batches, n_docs, n_words):
+    """
+        batches : (batch, grams, columns) triples, batch and grams from ngram_count.extract and
+                  columns from gram_columns
+        Return  : CSR matrix of word counts, one row per article
+    """
+    rows, cols = [], []
+    for batch, grams, columns in batches:
+        for n in grams:
+            part = batch[batch['order'] == n]
+            col = columns[n][part['gram']]
+            rows.append(part['doc'][col >= 0])
+            cols.append(col[col >= 0])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    matrix = sparse.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                               shape=(n_docs, n_words)).tocsr()
+    matrix.sum_duplicates()
+    return matrix
+
+
+def save_month(path, matrix, Id, TimeStamp, words):
+    matrix = matrix.tocsr()
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path,
+                        data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                        shape=np.asarray(matrix.shape),
+                        Id=np.asarray(Id, dtype=str), TimeStamp=np.asarray(TimeStamp, dtype=str),
+                        words=np.asarray(words, dtype=str))
+    os.replace(tmp_path, path)
+
+
+def load_month(path):
+    """Return: (CSR matrix, Id, TimeStamp, words)"""
+    with np.load(path) as f:
+        matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        return matrix, f['Id'], f['TimeStamp'], f['words']
+
+
+def save_coo(path, matrix, articles, words):
+    """
+        (global article index, word index, count) triplets of a month, for cosine.py and concat.py
+        articles : global index of every row of the matrix (article_registry.py)
+    """
+    matrix = matrix.tocoo()
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_path, article=np.asarray(articles, dtype=np.int64)[matrix.row],
+             word=matrix.col.astype(np.int32), count=matrix.data.astype(np.int32),
+             articles=np.asarray(articles, dtype=np.int64), words=np.asarray(words, dtype=str))
+    os.replace(tmp_path, path)
+
+
+def load_coo(path):
+    """Return: (article, word, count) triplets, global index of every article of the month, words"""
+    with np.load(path) as f:
+        return f['article'], f['word'], f['count'], f['articles'], f['words']
+
+
+def to_frame(matrix, Id, TimeStamp, words):
+    """Dense frame in the layout of the *_dtm.csv files: Id, TimeStamp, one column per word."""
+    df = pd.DataFrame(matrix.toarray(), columns=list(words))
+    df.insert(0, 'TimeStamp', TimeStamp)
+    df.insert(0, 'Id', Id)
+    return df
+
+
+def read_csv_month(path):
+    """Read a *_dtm.csv file into (CSR matrix, Id, TimeStamp, words)."""
+    df = pd.read_csv(path, delimiter=',')
+    words = df.columns[2:].tolist()
+    matrix = sparse.csr_matrix(df[words].to_numpy())
+    return matrix, df['Id'].to_numpy(), df['TimeStamp'].to_numpy(), words
+
+
+def write_csv(path, matrix, Id, TimeStamp, words, chunk=2000):
+    """Write the *_dtm.csv layout, densifying only `chunk` rows at a time."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Id', 'TimeStamp'] + list(words))
+        for start in range(0, matrix.shape[0], chunk):
+            block = matrix[start:start+chunk].toarray()
+            for i, row in enumerate(block):
+                writer.writerow([Id[start+i], TimeStamp[start+i]] + row.tolist())
@@ -0,0 +1,120 @@
+"""
+    Function           : Memoized stemming shared by token_cache, utils, dtm and ngram.
+                         News vocabulary is very repetitive, so every surface form is stemmed once
+                         per process and looked up afterwards. The memo is bounded, can be warmed
+                         from and saved to disk between runs, and reports its hit rate.
+
+                         Both variants used in the pipeline sit behind the same interface:
+                             snowball : nltk EnglishStemmer (Porter2), used by dtm and entropy
+                             porter   : nltk PorterStemmer (original Porter), used by ngram
+                         They differ mostly on adverbs and -y endings, e.g.
+                             generously -> generous (snowball) / gener (porter)
+                             fairly     -> fair (snowball)     / fairli (porter)
+                         so their caches are kept apart.
+
+                         Process pools and pandarallel fork their workers, so a stemmer warmed in
+                         the parent is inherited by every worker. Workers hand the forms they
+                         stemmed back with drain(); the parent merges them and saves the cache.
+"""
+
+import os
+import json
+import nltk
+from nltk import stem
+
+STEMMERS = {'snowball': stem.snowball.EnglishStemmer,
+            'porter': stem.PorterStemmer}
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+class Stemmer(object):
+
+    def __init__(self, kind='snowball', maxsize=2000000):
+        self.kind = kind
+        self.maxsize = maxsize
+        self._stem = STEMMERS[kind]().stem
+        self.memo = {}
+        # forms stemmed since the last drain()
+        self.new = {}
+        self.hits = 0
+        self.misses = 0
+
+    def stem(self, token):
+        result = self.memo.get(token)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = self._stem(token)
+        if len(self.memo) >= self.maxsize:
+            # drop the oldest half (dicts keep insertion order)
+            for key in list(self.memo)[:self.maxsize // 2]:
+                del self.memo[key]
+        self.memo[token] = result
+        if len(self.new) < self.maxsize:
+            self.new[token] = result
+        return result
+
+    def stem_tokens(self, tokens):
+        return [self.stem(token) for token in tokens]
+
+    def hit_rate(self):
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def report(self):
+        return (f'{self.kind} stemmer: {self.hits + self.misses} calls, {self.hit_rate():.1%} hits, '
+                f'{len(self.memo)} cached forms')
+
+    def drain(self):
+        """(new forms, hits, misses) since the last drain, to be merged by the parent process."""
+        drained = (self.new, self.hits, self.misses)
+        self.new, self.hits, self.misses = {}, 0, 0
+        return drained
+
+    def merge(self, drained):
+        new, hits, misses = drained
+        for token, result in new.items():
+            if len(self.memo) >= self.maxsize:
+                break
+            self.memo.setdefault(token, result)
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, path):
+        """Warm the memo from a saved cache; caches of another kind or nltk version are ignored."""
+        if not os.path.isfile(path):
+            return self
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get('kind') == self.kind and saved.get('nltk') == nltk.__version__:
+            for token, result in saved['memo'].items():
+                if len(self.memo) >= self.maxsize:
+                    break
+                self.memo.setdefault(token, result)
+        return self
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'kind': self.kind, 'nltk': nltk.__version__, 'memo': self.memo}, f)
+        os.replace(tmp_path, path)
+
+
+_stemmers = {}
+
+
+def get_stemmer(kind='snowball'):
+    """The stemmer of this process for `kind` (one memo per process and per kind)."""
+    if kind not in _stemmers:
+        _stemmers[kind] = Stemmer(kind)
+    return _stemmers[kind]
+
+
+def cache_path(cachePath, kind):
+    return f'{cachePath}/stem_{kind}.json'
@@ -0,0 +1,138 @@
+"""
+    Function           : Subject-tag index of one month of articles ({YYYYMM}_tags.npz).
+                         Subject lists are parsed once at ingestion and stored as
+                             tags     : the month's tag dictionary (tag id -> 'N2:CRU', ...)
+                             tag_ids  : tag ids of every article, article i in tag_ids[ptr[i]:ptr[i+1]]
+                             postings : inverted index, positions of the articles carrying tag t
+                                        in postings[post_ptr[t]:post_ptr[t+1]]
+                         Selecting the articles of a tag set is then an OR (any) or AND (all) of
+                         boolean article masks instead of a literal_eval of every subject string.
+"""
+
+import os
+import ast
+from array import array
+import numpy as np
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+class IndexBuilder(object):
+    """Interns the subject lists of articles added in order (article position = order of add)."""
+
+    def __init__(self):
+        self.tag_index = {}
+        self.tag_ids = array('i')
+        self.ptr = array('q', [0])
+
+    def add(self, subjects):
+        for tag in subjects:
+            self.tag_ids.append(self.tag_index.setdefault(tag, len(self.tag_index)))
+        self.ptr.append(len(self.tag_ids))
+
+    def extend(self, subject_lists):
+        for subjects in subject_lists:
+            self.add(subjects)
+        return self
+
+    def build(self):
+        tags = [None] * len(self.tag_index)
+        for tag, i in self.tag_index.items():
+            tags[i] = tag
+        return SubjectIndex(np.array(tags, dtype=str),
+                            np.frombuffer(self.tag_ids, dtype=np.int32).copy(),
+                            np.frombuffer(self.ptr, dtype=np.int64).copy())
+
+
+class SubjectIndex(object):
+
+    def __init__(self, tags, tag_ids, ptr):
+        self.tags = tags
+        self.tag_ids = tag_ids
+        self.ptr = ptr
+        self.lookup = {tag: i for i, tag in enumerate(tags.tolist())}
+        # inverted index: article positions sorted by tag id
+        article = np.repeat(np.arange(len(ptr) - 1), np.diff(ptr))
+        order = np.argsort(tag_ids, kind='stable')
+        self.postings = article[order]
+        self.post_ptr = np.concatenate([[0], np.cumsum(np.bincount(tag_ids, minlength=len(tags)))])
+
+    @classmethod
+    def from_subjects(cls, subjects):
+        """subjects: per article its list of tags, or the csv string of that list"""
+        return IndexBuilder().extend(ast.literal_eval(s) if isinstance(s, str) else s for s in subjects).build()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['tags'], f['tag_ids'], f['ptr'])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_path, tags=self.tags, tag_ids=self.tag_ids, ptr=self.ptr)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.ptr) - 1
+
+    def articles(self, tag):
+        """Positions of the articles carrying `tag`."""
+        t = self.lookup.get(tag)
+        if t is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.postings[self.post_ptr[t]:self.post_ptr[t+1]]
+
+    def any(self, tags):
+        """Boolean mask of the articles carrying at least one of `tags` (bitmap OR)."""
+        mask = np.zeros(len(self), dtype=bool)
+        for tag in set(tags):
+            mask[self.articles(tag)] = True
+        return mask
+
+    def all(self, tags):
+        """Boolean mask of the articles carrying every one of `tags` (bitmap AND)."""
+        mask = np.ones(len(self), dtype=bool)
+        for tag in set(tags):
+            hit = np.zeros(len(self), dtype=bool)
+            hit[self.articles(tag)] = True
+            mask &= hit
+        return mask
+
+    def subjects(self, positions=None):
+        """Subject lists of the articles at `positions` (default all), as parsed from the csv."""
+        if positions is None:
+            positions = range(len(self))
+        tags = self.tags.tolist()
+        return [[tags[t] for t in self.tag_ids[self.ptr[i]:self.ptr[i+1]]] for i in positions]
+
+
+def month_path(indexPath, YYYYMM):
+    return f'{indexPath}/{YYYYMM}_tags.npz'
+
+
+def load_month(indexPath, YYYYMM):
+    """Index of the month, None if it has not been built."""
+    path = month_path(indexPath, YYYYMM) if indexPath else None
+    return SubjectIndex.load(path) if path and os.path.isfile(path) else None
+
+
+if __name__ == '__main__':
+    # index the months of an existing info folder without re-running raw_info.py
+    import argparse
+    import pandas as pd
+    from tqdm import tqdm
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--inputPath', type=str,
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/info')
+    parser.add_argument('--indexPath', type=str,
+                        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/subject_index/info')
+    opt = parser.parse_args()
+    print(opt)
+
+    for file in tqdm(sorted(f for f in os.listdir(opt.inputPath) if f.endswith('_info.csv'))):
+        subjects = pd.read_csv(f'{opt.inputPath}/{file}', usecols=['subject'])['subject']
+        SubjectIndex.from_subjects(subjects).save(month_path(opt.indexPath, file[-15:-9]))
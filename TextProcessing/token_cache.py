@@ -0,0 +1,184 @@
+"""
+    Function           : Per-month token cache shared by dtm, ngram, entropy and sentcode.
+                         Each month is tokenized and stemmed once and written as integer-coded
+                         token streams with sentence and document offsets (one .npz per month).
+                         The cache directory is keyed by the cleaning configuration.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from nltk.tokenize import word_tokenize
+from nltk.util import ngrams
+
+from normalizer import get_clean0, split_sentences
+from utils import mark_neg, get_clean, get_total
+from stemming import get_stemmer
+
+# Bump when the tokenization itself changes so every cached month is rebuilt.
+CACHE_VERSION = 1
+
+# Cleaning configuration used by each downstream stage.
+CONFIGS = {
+    'dtm':       {'stemmer': 'snowball', 'negation': False, 'encoding': 'utf-8'},
+    'entropy':   {'stemmer': 'snowball', 'negation': False, 'encoding': 'utf-8'},
+    'ngram':     {'stemmer': 'porter',   'negation': False, 'encoding': 'utf-8'},
+    'sentiment': {'stemmer': None,       'negation': True,  'encoding': 'ISO-8859-1'},
+}
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def config_key(stemmer=None, negation=False, encoding='utf-8'):
+    """Directory name for a cleaning configuration, e.g. 'snowball-1a2b3c4d'."""
+    config = {'stemmer': stemmer, 'negation': negation, 'encoding': encoding, 'version': CACHE_VERSION}
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:8]
+    name = stemmer if stemmer else 'nostem'
+    if negation:
+        name += '-neg'
+    return f'{name}-{digest}'
+
+
+def month_path(cachePath, config, YYYYMM):
+    return f'{cachePath}/{config_key(**config)}/{YYYYMM}_tokens.npz'
+
+
+def find_month(cachePath, config, YYYYMM):
+    """Path of the cached month if it exists for this configuration, else None."""
+    if not cachePath:
+        return None
+    path = month_path(cachePath, config, YYYYMM)
+    return path if os.path.isfile(path) else None
+
+
+class StreamBuilder(object):
+    """Collects integer-coded sentences; doc_ptr indexes sent_ptr, sent_ptr indexes tokens."""
+
+    def __init__(self):
+        self.tokens = []
+        self.sent_ptr = [0]
+        self.doc_ptr = [0]
+
+    def add_doc(self, sentences):
+        for sentence in sentences:
+            self.tokens.extend(sentence)
+            self.sent_ptr.append(len(self.tokens))
+        self.doc_ptr.append(len(self.sent_ptr) - 1)
+
+    def arrays(self, name):
+        return {f'{name}_tokens': np.asarray(self.tokens, dtype=np.int32),
+                f'{name}_sent_ptr': np.asarray(self.sent_ptr, dtype=np.int64),
+                f'{name}_doc_ptr': np.asarray(self.doc_ptr, dtype=np.int64)}
+
+
+def tokenize_month(texts, stemmer=None, negation=False, **kwargs):
+    """
+        Streams written for a configuration:
+            doc   : get_clean0 over the whole article, tokenized and stemmed (one sentence per doc)
+            sent  : the article cut into sentence chunks, each cleaned, tokenized and stemmed
+            neg   : negation-marked tokens of the lower-cased article
+            total : word count of the lower-cased article after get_clean
+    """
+    vocab = {}
+
+    def encode(tokens):
+        return [vocab.setdefault(token, len(vocab)) for token in tokens]
+
+    arrays = {}
+    if stemmer:
+        stem_token = get_stemmer(stemmer).stem
+        doc, sent = StreamBuilder(), StreamBuilder()
+        for text in texts:
+            doc.add_doc([encode([stem_token(t) for t in word_tokenize(get_clean0(text))])])
+            sent.add_doc([encode([stem_token(t) for t in word_tokenize(get_clean0(l))])
+                          for l in split_sentences(text)])
+        arrays.update(doc.arrays('doc'))
+        arrays.update(sent.arrays('sent'))
+    if negation:
+        neg = StreamBuilder()
+        total = []
+        for text in texts:
+            text = text.lower()
+            neg.add_doc([encode(mark_neg(text))])
+            total.append(get_total(get_clean(text)))
+        arrays.update(neg.arrays('neg'))
+        arrays['total'] = np.asarray(total, dtype=np.int64)
+
+    vocab_list = [None] * len(vocab)
+    for token, i in vocab.items():
+        vocab_list[i] = token
+    arrays['vocab'] = np.array(vocab_list, dtype=str)
+    return arrays
+
+
+def write_month(path, df, arrays):
+    """Write atomically so an interrupted run never leaves a truncated month behind."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path,
+                        Id=np.array(df['Id'].tolist(), dtype=str),
+                        TimeStamp=np.array(df['TimeStamp'].tolist(), dtype=str),
+                        **arrays)
+    os.replace(tmp_path, path)
+
+
+def write_config(cachePath, config):
+    path = f'{cachePath}/{config_key(**config)}/config.json'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(dict(config, version=CACHE_VERSION), f, indent=2)
+
+
+class MonthTokens(object):
+    """Read side of one cached month."""
+
+    def __init__(self, path=None, arrays=None):
+        if path is not None:
+            with np.load(path) as data:
+                arrays = {k: data[k] for k in data.files}
+        self.arrays = arrays
+        self.vocab = self.arrays['vocab']
+        self.Id = self.arrays['Id']
+        self.TimeStamp = self.arrays['TimeStamp']
+
+    @classmethod
+    def from_text(cls, df, config):
+        """Tokenize an oil_info frame in memory, for months that are not cached."""
+        arrays = tokenize_month(df['augbod'].tolist(), **config)
+        arrays['Id'] = np.array(df['Id'].tolist(), dtype=str)
+        arrays['TimeStamp'] = np.array(df['TimeStamp'].tolist(), dtype=str)
+        return cls(arrays=arrays)
+
+    def __len__(self):
+        return len(self.Id)
+
+    def info(self):
+        return pd.DataFrame({'Id': self.Id, 'TimeStamp': self.TimeStamp})
+
+    def total(self):
+        return self.arrays['total']
+
+    def sentences(self, stream):
+        """Per document, the list of its sentences as lists of token strings."""
+        tokens = self.vocab[self.arrays[f'{stream}_tokens']].tolist()
+        sent_ptr = self.arrays[f'{stream}_sent_ptr']
+        doc_ptr = self.arrays[f'{stream}_doc_ptr']
+        docs = []
+        for d in range(len(doc_ptr) - 1):
+            docs.append([tokens[sent_ptr[s]:sent_ptr[s+1]] for s in range(doc_ptr[d], doc_ptr[d+1])])
+        return docs
+
+    def tokens(self, stream):
+        """Per document, all of its tokens as one list."""
+        return [[t for sentence in doc for t in sentence] for doc in self.sentences(stream)]
+
+    def ngrams(self, stream, n):
+        """Per document, the '.'-joined n-grams taken within each sentence."""
+        return [['.'.join(g) for sentence in doc for g in ngrams(sentence, n)]
+                for doc in self.sentences(stream)]
@@ -0,0 +1,79 @@
+#!/user/kh3191/.conda/envs/nlp/bin/python
+
+"""
+    Function           : Tokenize and stem every oil_info month once and write the token cache
+                         read by dtm, ngram, entropy and sentcode (see token_cache.py)
+"""
+
+import os
+from tqdm import tqdm
+from multiprocessing import Pool
+
+import token_cache
+import article_store
+import stemming
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--inputPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/oil_info')
+    parser.add_argument('--storePath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/oil_info')
+    parser.add_argument('--cachePath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/token_cache')
+    parser.add_argument('--stages', type=str, default='dtm,ngram,entropy,sentiment',
+           help='comma separated keys of token_cache.CONFIGS')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--overwrite', type=bool, default=False)
+    parser.add_argument('--months', type=str, default='',
+           help='comma separated YYYYMM to process (default all), set by pipeline.py')
+    opt = parser.parse_args()
+    return opt
+
+opt = parse_option()
+print(opt)
+
+
+def stemmer_kinds():
+    return sorted({token_cache.CONFIGS[s]['stemmer'] for s in opt.stages.split(',')} - {None})
+
+
+def tokenize_file(job):
+    YYYYMM, file = job
+    configs = {token_cache.config_key(**c): c for c in [token_cache.CONFIGS[s] for s in opt.stages.split(',')]}
+    for config in configs.values():
+        path = token_cache.month_path(opt.cachePath, config, YYYYMM)
+        if os.path.isfile(path) and not opt.overwrite:
+            continue
+        df = article_store.read_info(opt.storePath, file, YYYYMM, ['Id', 'TimeStamp', 'augbod'], config['encoding'])
+        arrays = token_cache.tokenize_month(df['augbod'].tolist(), **config)
+        token_cache.write_month(path, df, arrays)
+    # forms this worker stemmed, merged into the persisted memo by main()
+    return {kind: stemming.get_stemmer(kind).drain() for kind in stemmer_kinds()}
+
+
+def main():
+    for stage in opt.stages.split(','):
+        token_cache.write_config(opt.cachePath, token_cache.CONFIGS[stage])
+
+    # warm before forking so every worker starts from the persisted memo
+    for kind in stemmer_kinds():
+        stemming.get_stemmer(kind).load(stemming.cache_path(opt.cachePath, kind))
+
+    files = [(YYYYMM, file) for YYYYMM, file in article_store.month_files(opt.storePath, opt.inputPath, 'oil_').items()
+             if not opt.months or YYYYMM in opt.months.split(',')]
+    with Pool(opt.workers) as pool:
+        for drained in tqdm(pool.imap_unordered(tokenize_file, files), total=len(files)):
+            for kind, d in drained.items():
+                stemming.get_stemmer(kind).merge(d)
+
+    for kind in stemmer_kinds():
+        stemmer = stemming.get_stemmer(kind)
+        print(stemmer.report())
+        stemmer.save(stemming.cache_path(opt.cachePath, kind))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 #!/user/kh3191/.conda/envs/nlp/bin/python
 
 """
-    Function           : This code calculates the allocation of the topics for each article 
+    Function           : This code calculates the allocation of the topics for each article
 """
 
 import numpy as np
@@ -9,19 +9,29 @@ import pandas as pd
 import os
 from tqdm import tqdm
 
+import sparse_dtm
+import topics
+import article_store
+
 import argparse
 from argparse import RawTextHelpFormatter
 def parse_option():
     parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
-    parser.add_argument('--inputWordsPath', type=str, 
+    parser.add_argument('--inputWordsPath', type=str,
        default='clustering_C.csv')
-    parser.add_argument('--inputPath_info', type=str, 
+    parser.add_argument('--weightColumn', type=str, default='',
+       help='column of inputWordsPath holding soft topic memberships (default: 0/1 memberships)')
+    parser.add_argument('--inputPath_info', type=str,
        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/oil_info')
-    parser.add_argument('--inputPath_dtm', type=str, 
+    parser.add_argument('--storePath_info', type=str,
+       default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_store/oil_info')
+    parser.add_argument('--inputPath_dtm', type=str,
        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/dtm_Clustering_C')
-    parser.add_argument('--outputPath', type=str, 
+    parser.add_argument('--outputPath', type=str,
        default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/article_measure/topic_allocation')
     parser.add_argument('--n_topics', type=int, default=7)
+    parser.add_argument('--months', type=str, default='',
+       help='comma separated YYYYMM to process (default all), set by pipeline.py')
     opt = parser.parse_args()
     return opt
 
@@ -29,31 +39,32 @@ opt = parse_option()
 print(opt)
 
 
-for file in tqdm(os.listdir(opt.inputPath_dtm)):
-    YYYYMM = file[-15:-8]
-
-    df_dtm = pd.read_csv(f'{opt.inputPath_dtm}/{YYYYMM}_dtm.csv', delimiter=',')
-    df_info = pd.read_csv(f'{opt.inputPath_info}/oil_{YYYYMM}_info.csv', delimiter=',')
-    topics = pd.read_csv(opt.inputWordsPath, sep=',', index_col=0)
-
-    topics_list = [topics.index[topics['Topic'] == i].tolist() for i in range(1,opt.n_topics+1)]
+def read_dtm(YYYYMM):
+    # prefer the sparse file written by dtm.py
+    path = f'{opt.inputPath_dtm}/{YYYYMM}_dtm.npz'
+    if os.path.isfile(path):
+        return sparse_dtm.load_month(path)
+    return sparse_dtm.read_csv_month(f'{opt.inputPath_dtm}/{YYYYMM}_dtm.csv')
 
-    df0=pd.DataFrame()
-    for i in range(opt.n_topics):
-        data=[]
-        for index, row in df_dtm.iterrows():
-            #print(index)
-            x=sum(df_dtm.loc[index,topics_list[i]])
-            data.append(x)
-        df0['Topic'+str(i+1)]=data
 
+if __name__ == '__main__':
 
-    df0['sum'] = df0.sum(axis=1)
-    df0 = df0.loc[:,'Topic1':f'Topic{opt.n_topics}'].div(df0['sum'], axis=0)
-    df0=df0.fillna(0)
+    df_topics = topics.read_topics(opt.inputWordsPath, opt.weightColumn)
+    memberships = {}
 
+    months = sorted({file[:6] for file in os.listdir(opt.inputPath_dtm) if file.endswith(('_dtm.npz', '_dtm.csv'))})
+    if opt.months:
+        months = [YYYYMM for YYYYMM in months if YYYYMM in opt.months.split(',')]
+    for YYYYMM in tqdm(months):
 
-    df0['headline']=df_info['headline']
-    df0.to_csv(f'{opt.outputPath}/{YYYYMM}_topic_alloc.csv',index=False)
+        dtm, Id, TimeStamp, words = read_dtm(YYYYMM)
+        words = tuple(words)
+        if words not in memberships:
+            memberships[words] = topics.membership_matrix(df_topics, words, opt.n_topics)
 
+        df0 = topics.allocation_frame(topics.allocate(dtm, memberships[words]))
 
+        df_info = article_store.read_info(opt.storePath_info, f'{opt.inputPath_info}/oil_{YYYYMM}_info.csv',
+                                          YYYYMM, ['headline'])
+        df0['headline']=df_info['headline']
+        df0.to_csv(f'{opt.outputPath}/{YYYYMM}_topic_alloc.csv',index=False)
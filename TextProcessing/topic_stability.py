@@ -0,0 +1,202 @@
+#!/user/kh3191/.conda/envs/nlp/bin/python
+
+"""
+    Function           : Bootstrap stability of the Louvain topics (the hand checks of topic_stability.ipynb).
+                         Every replicate draws the articles of the sample window with replacement
+                         (weights w, one per article), so its Gram matrix is
+                             G_b = X^T diag(w) X = G + X_D^T diag(w_D - 1) X_D
+                         with X the articles x words dtm of the sparse corpus (concat.py), G = X^T X
+                         computed once and D the articles drawn other than once: only those rows are
+                         read. The words are clustered with louvain_kernel as louvain.py does, one
+                         replicate per task of a process pool, and each replicate is saved under
+                         --outputPath/replicates, so a run can be stopped and extended (--replicates).
+                         Output:
+                             coassignment.csv   share of the replicates putting two words in one topic
+                             word_stability.csv per word of the reference topics: share of the replicates
+                                                keeping it in the topic matched to its reference topic,
+                                                mean co-assignment with its topic and with other words
+                             topic_match.csv    per reference topic: Jaccard similarity with its matched
+                                                topic (one to one matching on the overlap), mean and
+                                                quantiles over the replicates
+                             replicates.csv     modularity and number of topics of every replicate
+"""
+
+import os
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from scipy.optimize import linear_sum_assignment
+from tqdm import tqdm
+
+import louvain_kernel
+from gram_matrix import GramMatrix
+from sparse_corpus import SparseCorpus
+
+import argparse
+from argparse import RawTextHelpFormatter
+def parse_option():
+    parser = argparse.ArgumentParser(formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--corpusPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/concat/dtm_corpus')
+    parser.add_argument('--referencePath', type=str, default='clustering_C.csv', help='reference topics (word, Topic)')
+    parser.add_argument('--outputPath', type=str,
+           default='/shared/share_mamaysky-glasserman/energy_drivers/2023/DataProcessing/topic_stability')
+    parser.add_argument('--startMonth', type=str, default='', help='YYYYMM, first month of the sample window (default all)')
+    parser.add_argument('--endMonth', type=str, default='')
+    parser.add_argument('--replicates', type=int, default=200)
+    parser.add_argument('--restarts', type=int, default=10, help='Louvain runs per replicate, the best modularity is kept')
+    parser.add_argument('--resolution', type=float, default=1.0)
+    parser.add_argument('--minSimilarity', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    opt = parser.parse_args()
+    return opt
+
+opt = parse_option()
+print(opt)
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def replicate_path(b):
+    return f'{opt.outputPath}/replicates/{b:05d}.npz'
+
+
+def check_params():
+    """Replicates of an earlier run are reused only with the same window, corpus and settings."""
+    corpus = SparseCorpus(opt.corpusPath)
+    months = [m for m in corpus.months.index if (not opt.startMonth or m >= opt.startMonth) and (not opt.endMonth or m <= opt.endMonth)]
+    params = {'months': {m: corpus.stamp(m) for m in months}, 'restarts': opt.restarts, 'resolution': opt.resolution,
+              'minSimilarity': opt.minSimilarity, 'seed': opt.seed}
+    path = f'{opt.outputPath}/replicates/params.json'
+    if os.path.isfile(path):
+        with open(path) as f:
+            if json.load(f) != params:
+                raise ValueError(f'{path}: replicates of other settings or months, use another --outputPath')
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(params, f)
+
+
+def load_sample():
+    """Articles x words dtm of the window, its Gram matrix and word totals (shared with the workers by fork)."""
+    global X, G, TOTALS, WORDS
+    corpus = SparseCorpus(opt.corpusPath)
+    X, _ = corpus.span(opt.startMonth, opt.endMonth)
+    X = X.astype(np.int64)
+    G = (X.T @ X).toarray()
+    TOTALS = np.asarray(X.sum(axis=0)).ravel()
+    WORDS = corpus.words
+
+
+def bootstrap(b):
+    """Topic of every word (-1 if absent from the sample) in replicate b."""
+    rng = np.random.default_rng([opt.seed, b])
+    n = X.shape[0]
+    weight = np.bincount(rng.integers(0, n, n), minlength=n)
+    drawn = np.nonzero(weight != 1)[0]
+    rows = X[drawn]
+    delta = rows.multiply((weight[drawn] - 1)[:, None]).tocsr()
+    gram = GramMatrix(WORDS, G + (rows.T @ delta).toarray(), totals=TOTALS + np.asarray(delta.sum(axis=0)).ravel())
+
+    used = gram.totals > 0
+    graph = louvain_kernel.adjacency(gram.cosine()[np.ix_(used, used)], opt.minSimilarity)
+    best = max((louvain_kernel.louvain(graph, opt.resolution, [opt.seed, b, r]) for r in range(opt.restarts)),
+               key=lambda run: run[1])
+    labels = np.full(len(WORDS), -1)
+    labels[used] = best[0]
+    tmp_path = replicate_path(b)[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_path, labels=labels, modularity=best[1])
+    os.replace(tmp_path, replicate_path(b))
+    return b
+
+
+def match_topics(reference, labels):
+    """
+        reference : reference topic of every word (-1 if not in the reference)
+        labels    : replicate topic of every word (-1 if absent)
+        Return    : reference topic -> matched replicate topic (one to one, largest total overlap)
+    """
+    both = (reference >= 0) & (labels >= 0)
+    ref_topics, ref_codes = np.unique(reference[both], return_inverse=True)
+    rep_topics, rep_codes = np.unique(labels[both], return_inverse=True)
+    overlap = np.zeros((len(ref_topics), len(rep_topics)))
+    np.add.at(overlap, (ref_codes, rep_codes), 1)
+    rows, cols = linear_sum_assignment(-overlap)
+    return {ref_topics[r]: rep_topics[c] for r, c in zip(rows, cols)}
+
+
+def summarize(labels, modularity):
+    words = np.asarray(WORDS)
+    ref = pd.read_csv(opt.referencePath, sep=',')
+    ref_topic = dict(zip(ref['word'], ref['Topic']))
+    reference = np.array([ref_topic.get(w, -1) for w in words])
+    topics = np.unique(reference[reference >= 0])
+
+    # co-assignment over the replicates where both words occur
+    together = np.zeros((len(words), len(words)))
+    present = np.zeros((len(words), len(words)))
+    kept = np.zeros(len(words))
+    jaccard = np.full((len(labels), len(topics)), np.nan)
+    for b, l in enumerate(labels):
+        occurs = l >= 0
+        together += (l[:, None] == l[None, :]) & occurs[:, None]
+        present += occurs[:, None] & occurs[None, :]
+        match = match_topics(reference, l)
+        matched = np.array([match.get(t, -2) for t in reference])
+        kept += occurs & (matched == l)
+        for t, topic in enumerate(topics):
+            if topic in match:
+                a, c = reference == topic, l == match[topic]
+                jaccard[b, t] = (a & c).sum() / (a | c).sum()
+    coassignment = np.divide(together, present, out=np.full_like(together, np.nan), where=present > 0)
+    pd.DataFrame(coassignment, index=words, columns=words).to_csv(f'{opt.outputPath}/coassignment.csv')
+
+    same = reference[:, None] == reference[None, :]
+    np.fill_diagonal(same, False)
+    other = (reference[:, None] != reference[None, :]) & (reference >= 0)[None, :]
+    # words and topics never seen in a replicate give empty slices (NaN)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        stability = pd.DataFrame({'word': words, 'Topic': reference, 'freq': TOTALS,
+                                  'match_rate': kept / len(labels),
+                                  'coassign_topic': np.nanmean(np.where(same, coassignment, np.nan), axis=1),
+                                  'coassign_other': np.nanmean(np.where(other, coassignment, np.nan), axis=1)})
+        match = pd.DataFrame({'Topic': topics, 'words': [(reference == t).sum() for t in topics],
+                              'jaccard_mean': np.nanmean(jaccard, axis=0), 'jaccard_q05': np.nanquantile(jaccard, 0.05, axis=0),
+                              'jaccard_median': np.nanmedian(jaccard, axis=0), 'jaccard_q95': np.nanquantile(jaccard, 0.95, axis=0),
+                              'unmatched': np.isnan(jaccard).mean(axis=0)})
+    stability = stability[stability['Topic'] >= 0].sort_values(['Topic', 'freq'], ascending=[True, False])
+    stability.to_csv(f'{opt.outputPath}/word_stability.csv', index=False)
+    match.to_csv(f'{opt.outputPath}/topic_match.csv', index=False)
+    pd.DataFrame({'replicate': range(len(labels)), 'modularity': modularity,
+                  'n_topics': [len(np.unique(l[l >= 0])) for l in labels]}).to_csv(f'{opt.outputPath}/replicates.csv', index=False)
+    print(match.to_string(index=False))
+
+
+def main():
+    check_params()
+    load_sample()
+    print(f'{X.shape[0]} articles, {X.nnz} word counts, {len(WORDS)} words')
+    todo = [b for b in range(opt.replicates) if not os.path.isfile(replicate_path(b))]
+    print(f'{opt.replicates - len(todo)} of {opt.replicates} replicates already done')
+    if todo:
+        with Pool(opt.workers) as pool:
+            for _ in tqdm(pool.imap_unordered(bootstrap, todo), total=len(todo)):
+                pass
+    labels, modularity = [], []
+    for b in range(opt.replicates):
+        with np.load(replicate_path(b)) as f:
+            labels.append(f['labels'])
+            modularity.append(float(f['modularity']))
+    summarize(labels, modularity)
+
+
+if __name__ == '__main__':
+    main()
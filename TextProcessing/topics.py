@@ -0,0 +1,47 @@
+"""
+    Function           : Topic membership matrices and article-level topic allocation.
+                         allocation = row-normalized (DTM x membership), with DTM articles x words
+                         and membership words x topics (0/1 from clustering_C.csv, or soft weights).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+########################################################
+#
+# Functions
+#
+########################################################
+def read_topics(path, weightColumn=''):
+    """
+        Long table of (word, Topic, weight). A word may appear under several topics when the
+        memberships are soft; without a weight column every membership has weight 1.
+    """
+    topics = pd.read_csv(path, sep=',')
+    topics = topics.rename(columns={topics.columns[0]: 'word'})
+    topics['weight'] = topics[weightColumn].astype(float) if weightColumn else 1.0
+    return topics[['word', 'Topic', 'weight']]
+
+
+def membership_matrix(topics, words, n_topics):
+    """Sparse words x topics matrix aligned to the DTM columns `words` (topics numbered from 1)."""
+    index = {word: i for i, word in enumerate(words)}
+    topics = topics[topics['word'].isin(index) & topics['Topic'].between(1, n_topics)]
+    rows = topics['word'].map(index).to_numpy()
+    cols = topics['Topic'].to_numpy().astype(int) - 1
+    return sparse.csr_matrix((topics['weight'].to_numpy(), (rows, cols)), shape=(len(words), n_topics))
+
+
+def allocate(dtm, membership):
+    """Share of each article's topic words falling in each topic; articles without any get 0."""
+    counts = np.asarray((dtm @ membership).todense(), dtype=float)
+    total = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alloc = np.where(total > 0, counts / total, 0.0)
+    return alloc
+
+
+def allocation_frame(alloc):
+    return pd.DataFrame(alloc, columns=[f'Topic{i+1}' for i in range(alloc.shape[1])])
@@ -1,10 +1,9 @@
 import re
 from nltk.tokenize import word_tokenize
 from nltk.sentiment.util import mark_negation
-from nltk.corpus import stopwords
-stop = stopwords.words('english')
-from nltk import stem 
-stemmer = stem.snowball.EnglishStemmer()
+from normalizer import get_clean0, split_sentences, STOPWORDS
+from stemming import get_stemmer
+stemmer = get_stemmer('snowball')
 from nltk.util import ngrams
 
 ######################################################## 
@@ -20,64 +19,14 @@ def mark_neg(sample):
 def get_clean(sample):
     document = re.sub('[^a-z]', ' ', sample)
     cleanup = document.strip().split()
-    words = [word for word in cleanup if word not in set(stop)]
-    result = ' '.join(words)
-    return result
-
-
-def get_clean0(sample):
-
-    sample = sample.upper().split('\n')
-    sample = ['' if (('NEWSDESK' in xx) & (len(sample)-yy <= 5 )) else xx for yy, xx in enumerate(sample)]
-    sample = ' '.join(sample)
-    sample = re.sub(r'\(.*?\)','',sample)
-    sample = re.sub(r'<.*?>','',sample)
-    
-    sample = re.sub('CBOT|CHICAGO BOARD OF TRADE|CHICAGO MERCANTILE EXCHANGE|CME','',sample)
-
-    sample = sample.lower()
-    sample = re.sub('s&p', 'snp', sample)
-    sample = re.sub('s & p', 'snp', sample)
-    sample = re.sub("standard[\s]&[\s]poor's", 'snp', sample)
-    sample = re.sub("standard[\s]and[\s]poor's", 'snp', sample)
-    sample = re.sub("snp[\s]500", 'snp500', sample)
-    sample = re.sub("dow[\s]jones[\s]industrial[\s]average", 'djia', sample)
-    sample = re.sub("new[\s]york[\s]stock[\s]exchange", 'nyse', sample)
-    sample = re.sub("london[\s]stock[\s]exchange", 'ftse', sample)
-    sample = re.sub("stock[\s]exchange[\s]of[\s]hong[\s]kong", 'sehk', sample)
-    sample = re.sub("australian[\s]stock[\s]exchange", 'asx', sample)
-    sample = re.sub("fannie[\s]mae", 'fnma', sample)
-    sample = re.sub("freddie[\s]mac", 'fdmc', sample)
-    sample = re.sub("federal[\s]reserve", 'fed', sample)
-    sample = re.sub("securities[\s]and[\s]exchange[\s]commission", 'sec', sample)
-    sample = re.sub("chief[\s]executive[\s]officer", 'ceo', sample)
-    sample = re.sub("chief[\s]financial[\s]officer", 'cfo', sample)
-    sample = re.sub("chief[\s]operating[\s]officer", 'coo', sample)
-    sample = re.sub("chief[\s]investment[\s]officer", 'cio', sample)
-    sample = re.sub("vice[\s]president", 'vp', sample)
-    sample = re.sub("international[\s]monetary[\s]fund", 'imf', sample)
-    sample = re.sub('[0-9]{9}[0-9]+', ' _bn_ ', sample)
-    sample = re.sub('[0-9]{6}[0-9]+', ' _mn_ ', sample)
-    sample = re.sub('_n_[\s]+billion', ' _bn_ ', sample)
-    sample = re.sub('_n_[\s]+million', ' _mn_ ', sample)
-    sample = ' '.join(s for s in sample.split() if not any(c.isdigit() for c in s))
-
-    document = re.sub('[^a-z]', ' ', sample)
-    cleanup = document.strip().split()
-    words = [word for word in cleanup if word not in set(stop)]
+    words = [word for word in cleanup if word not in STOPWORDS]
     result = ' '.join(words)
     return result
 
 
 def get_clean4(sample):
     Trigrams = []
-    sample = sample.upper().split('\n')
-    sample = ' '.join(sample)
-    sample = re.sub(r'\(.*?\)','',sample)
-    sample = re.sub(r'<.*?>','',sample)
-    total = sample.replace('?', '***').replace('!', '***').replace('.', '***').replace(':', '***').replace(';', '***').split('***')
-
-    for l in total:
+    for l in split_sentences(sample):
         lx = get_clean0(l)
         tokens = word_tokenize(lx)
         cleanup = [stemmer.stem(token) for token in tokens]